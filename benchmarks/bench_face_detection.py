@@ -0,0 +1,127 @@
+"""Latency / recall trade-off of downscaled face detection in GazeTracking.
+
+Runs the dlib face detector at several detection scales over recorded
+clips, with landmarks always predicted on the full resolution frame. The
+full resolution detections are the reference: recall is the fraction of
+reference faces also found at a given scale (IoU >= 0.5), and the landmark
+error is the mean distance (pixels) between the 68 landmarks predicted from
+the scaled and the reference rectangles.
+
+    python -m benchmarks.bench_face_detection --video lobby.avi
+    python -m benchmarks.bench_face_detection --video lobby.avi --scales 1 0.5 0.35 --resolutions 720p
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import dlib
+import numpy as np
+
+import gaze_tracking
+from benchmarks.common import RESOLUTIONS, compare, print_table, save_results, summarize, video_frames
+from gaze_tracking.face_tracker import FaceTracker, rect_iou
+
+PREDICTOR_PATH = os.path.join(os.path.dirname(os.path.abspath(gaze_tracking.__file__)),
+                              "trained_models", "shape_predictor_68_face_landmarks.dat")
+
+
+def landmark_points(shape):
+    return np.array([(p.x, p.y) for p in shape.parts()], dtype=float)
+
+
+def run_scale(detector, predictor, frames, scale):
+    """Returns (detect seconds, landmark seconds, faces per frame, landmarks per frame)"""
+    tracker = FaceTracker(detector, detect_scale=scale)
+    detect_times, landmark_times, faces, landmarks = [], [], [], []
+    for gray in frames:
+        start = time.perf_counter()
+        rects = tracker.detect(gray)
+        detect_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        shapes = [landmark_points(predictor(gray, rect)) for rect in rects]
+        landmark_times.append(time.perf_counter() - start)
+
+        faces.append(list(rects))
+        landmarks.append(shapes)
+    return detect_times, landmark_times, faces, landmarks
+
+
+def accuracy(faces, landmarks, ref_faces, ref_landmarks):
+    """Recall against the reference detections and mean landmark error of matched faces"""
+    expected = found = 0
+    errors = []
+    for rects, shapes, ref_rects, ref_shapes in zip(faces, landmarks, ref_faces, ref_landmarks):
+        for ref_rect, ref_shape in zip(ref_rects, ref_shapes):
+            expected += 1
+            overlaps = [rect_iou(ref_rect, rect) for rect in rects]
+            if overlaps and max(overlaps) >= 0.5:
+                found += 1
+                shape = shapes[int(np.argmax(overlaps))]
+                errors.append(float(np.linalg.norm(shape - ref_shape, axis=1).mean()))
+    return {
+        "reference_faces": expected,
+        "recall": found / expected if expected else None,
+        "landmark_error_px": float(np.mean(errors)) if errors else None,
+    }
+
+
+def benchmark_case(detector, predictor, frames, scales, warmup):
+    gray_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames]
+    _, _, ref_faces, ref_landmarks = run_scale(detector, predictor, gray_frames, 1.0)
+
+    stages = {}
+    for scale in scales:
+        detect_times, landmark_times, faces, landmarks = run_scale(detector, predictor, gray_frames, scale)
+        stats = summarize(detect_times[warmup:])
+        stats.update(accuracy(faces, landmarks, ref_faces, ref_landmarks))
+        stages[f"detect@{scale:g}"] = stats
+        stages[f"landmarks@{scale:g}"] = summarize(landmark_times[warmup:])
+    return stages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark downscaled face detection on recorded clips.")
+    parser.add_argument("--video", action="append", required=True, help="recorded clip with faces (repeatable)")
+    parser.add_argument("--scales", nargs="+", type=float, default=[1.0, 0.75, 0.5, 0.35, 0.25])
+    parser.add_argument("--resolutions", nargs="+", default=["720p"], choices=list(RESOLUTIONS))
+    parser.add_argument("--frames", type=int, default=120, help="frames per clip")
+    parser.add_argument("--warmup", type=int, default=3, help="leading frames excluded from latency statistics")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/face_detection_<time>.json)")
+    parser.add_argument("--compare", help="previous result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown flagged as regression")
+    args = parser.parse_args(argv)
+
+    detector = dlib.get_frontal_face_detector()
+    predictor = dlib.shape_predictor(PREDICTOR_PATH)
+
+    results = {}
+    for path in args.video:
+        name = os.path.splitext(os.path.basename(path))[0]
+        for res in args.resolutions:
+            case = f"{name}_{res}"
+            frames = list(video_frames(path, count=args.frames, size=RESOLUTIONS[res]))
+            if len(frames) <= args.warmup:
+                print(f"Skipping {case}: not enough frames", file=sys.stderr)
+                continue
+            results[case] = benchmark_case(detector, predictor, frames, args.scales, args.warmup)
+            print_table(case, results[case])
+            for stage, stats in results[case].items():
+                if stats.get("recall") is not None:
+                    print(f"{stage:<22} recall {stats['recall']:.3f}  landmark error "
+                          f"{stats['landmark_error_px'] or 0.0:.2f} px  ({stats['reference_faces']} faces)")
+
+    path = save_results("face_detection", results, args.output)
+    print(f"Results written to {path}")
+
+    if args.compare:
+        print()
+        if compare(args.compare, results, threshold=args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""Per-stage latency benchmark of the security frame pipeline.
+
+Drives the individual stages of SecurityEngine (distortion, low light,
+ROI, MOG2 + findContours, gaze, YOLO, plot, recording write and display
+conversion) over synthetic and recorded video at several resolutions.
+The per-stage timings cover both ROI variants (zero-padded mask and crop),
+while the end-to-end totals run SecurityEngine.process_batch itself, once
+per variant, with its motion gating and detection reuse.
+Results are stored under benchmarks/results/ and can be compared with a
+previous run to spot regressions:
+
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --video clip.avi --resolutions 720p 1080p
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/pipeline_20250101_120000.json
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from benchmarks.common import (RESOLUTIONS, compare, print_table, save_results, summarize,
+                               synthetic_frames, video_frames)
+from recording import RecordingWriter
+from security_engine import DEFAULT_SETTINGS, Camera, SecurityEngine
+
+STAGES = [
+    "correct_distortion",
+    "enhance_low_light",
+    "roi_mask",
+    "roi_crop",
+    "mog2_contours",
+    "gaze_refresh",
+    "yolo",
+    "plot",
+    "record_write",
+    "display",
+]
+
+
+class StageTimer(object):
+    """Times (or, with trace_memory, measures peak allocation of) each stage call"""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.samples = defaultdict(list)
+        self.peaks = defaultdict(int)
+
+    def __call__(self, stage, fn, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            result = fn(*args, **kwargs)
+            self.peaks[stage] = max(self.peaks[stage], tracemalloc.get_traced_memory()[1] - base)
+            return result
+
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples[stage].append(time.perf_counter() - start)
+        return result
+
+
+def mask_roi(frame, rect):
+    """Zero-padded ROI copy, as used by the masked (auto ROI) path"""
+    x1, y1, x2, y2 = rect
+    masked = np.zeros_like(frame)
+    masked[y1:y2, x1:x2] = frame[y1:y2, x1:x2]
+    return masked
+
+
+def motion_contours(fgbg, frame, offset):
+    mask = fgbg.apply(frame)
+    _, mask = cv2.threshold(mask, 254, 255, cv2.THRESH_BINARY)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
+    return contours
+
+
+def to_display(frame, size):
+    return cv2.cvtColor(cv2.resize(frame, size), cv2.COLOR_BGR2RGB)
+
+
+def run_frames(engine, frames, timer, use_gaze=True, display_size=(960, 540), warmup=0):
+    """Runs every stage over `frames`; the first `warmup` frames are not recorded"""
+    camera = Camera(None, "BENCH")
+    height, width = frames[0].shape[:2]
+    out_path = os.path.join(tempfile.mkdtemp(), "bench.avi")
+    writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*'MJPG'), 20.0, (width, height))
+    x1, y1 = int(width*0.1), int(height*0.3)
+    x2, y2 = int(width*0.9), int(height*0.9)
+
+    try:
+        for i, frame in enumerate(frames):
+            step = timer if i >= warmup else (lambda stage, fn, *a, **kw: fn(*a, **kw))
+
+            frame = step("correct_distortion", engine.correct_distortion, camera, frame)
+            frame = step("enhance_low_light", engine.enhance_low_light, frame)
+            step("roi_mask", mask_roi, frame, (x1, y1, x2, y2))
+            crop = step("roi_crop", lambda: frame[y1:y2, x1:x2])
+            step("mog2_contours", motion_contours, camera.fgbg, crop, (x1, y1))
+            if use_gaze:
+                step("gaze_refresh", engine.gaze.refresh, frame)
+            results = step("yolo", engine.model, crop, verbose=False)
+            engine.offset_detections(results, x1, y1)
+            annotated = step("plot", results[0].plot, img=frame)
+            step("record_write", writer.write, annotated)
+            step("display", to_display, annotated, display_size)
+    finally:
+        writer.release()
+        os.remove(out_path)
+
+
+def run_pipeline(engine, frames, crop_to_roi, use_gaze=True, warmup=0):
+    """Times engine.process_batch on every frame of a fresh camera, with the
+    ROI cropped or zero-padded; returns the durations of the timed frames
+    """
+    camera = Camera(None, "BENCH")
+    camera.writer = RecordingWriter("BENCH")
+    saved = engine.cameras, engine.settings, engine.recordings_dir, engine.crop_to_roi
+    # The benchmark camera stands in as the primary camera, which gaze tracking follows
+    engine.cameras = [camera]
+    engine.settings = dict(DEFAULT_SETTINGS, use_gaze=use_gaze, use_auto_roi=False)
+    engine.recordings_dir = tempfile.mkdtemp()
+    engine.crop_to_roi = crop_to_roi
+
+    samples = []
+    try:
+        for i, frame in enumerate(frames):
+            start = time.perf_counter()
+            engine.process_batch([(camera, frame)])
+            if i >= warmup:
+                samples.append(time.perf_counter() - start)
+    finally:
+        engine.stop_recording(camera)
+        camera.writer.shutdown()
+        shutil.rmtree(engine.recordings_dir, ignore_errors=True)
+        engine.cameras, engine.settings, engine.recordings_dir, engine.crop_to_roi = saved
+    return samples
+
+
+def benchmark_case(engine, frames, use_gaze, warmup):
+    timer = StageTimer()
+    run_frames(engine, frames, timer, use_gaze=use_gaze, warmup=warmup)
+
+    # Separate, untimed pass for allocations: tracing slows every call down
+    memory = StageTimer(trace_memory=True)
+    tracemalloc.start()
+    try:
+        run_frames(engine, frames[:min(len(frames), 5)], memory, use_gaze=use_gaze)
+    finally:
+        tracemalloc.stop()
+
+    stages = {stage: summarize(timer.samples[stage], memory.peaks.get(stage))
+              for stage in STAGES if timer.samples.get(stage)}
+    # Stage timings include both ROI variants, so they are not summed: the
+    # totals come from the engine's own pipeline, one per ROI variant
+    stages["total_crop"] = summarize(run_pipeline(engine, frames, True, use_gaze=use_gaze, warmup=warmup))
+    stages["total_masked"] = summarize(run_pipeline(engine, frames, False, use_gaze=use_gaze, warmup=warmup))
+    return stages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the security frame pipeline.")
+    parser.add_argument("--video", action="append", default=[], help="recorded clip to include (repeatable)")
+    parser.add_argument("--resolutions", nargs="+", default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument("--frames", type=int, default=60, help="frames per case")
+    parser.add_argument("--warmup", type=int, default=5, help="leading frames excluded from statistics")
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--no-gaze", action="store_true", help="skip GazeTracking.refresh")
+    parser.add_argument("--gaze-detect-interval", type=int, default=5,
+                        help="frames between full face detections (1 detects on every frame)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/pipeline_<time>.json)")
+    parser.add_argument("--compare", help="previous result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown flagged as regression")
+    args = parser.parse_args(argv)
+
+    engine = SecurityEngine(sources=(), model_path=args.model, gaze_detect_interval=args.gaze_detect_interval,
+                            calibration_profiles=None, incident_index=None)
+
+    cases = {}
+    for res in args.resolutions:
+        size = RESOLUTIONS[res]
+        cases[f"synthetic_{res}"] = list(synthetic_frames(*size, count=args.frames))
+        for path in args.video:
+            name = os.path.splitext(os.path.basename(path))[0]
+            cases[f"{name}_{res}"] = list(video_frames(path, count=args.frames, size=size))
+
+    results = {}
+    for case, frames in cases.items():
+        if len(frames) <= args.warmup:
+            print(f"Skipping {case}: not enough frames", file=sys.stderr)
+            continue
+        results[case] = benchmark_case(engine, frames, use_gaze=not args.no_gaze, warmup=args.warmup)
+        print_table(case, results[case])
+
+    try:
+        import resource
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+        print(f"\nProcess peak RSS: {peak_rss_mb:.1f} MB")
+    except ImportError:
+        pass
+
+    path = save_results("pipeline", results, args.output)
+    print(f"Results written to {path}")
+
+    if args.compare:
+        print()
+        if compare(args.compare, results, threshold=args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Per-eye latency and localization error of the pupil detection engines.
+
+Runs every registered engine (see gaze_tracking/pupil_detectors.py) over a
+set of labeled eye crops and reports, per engine, the latency of one eye,
+the detection rate and the distance (pixels) between the detected and the
+labeled pupil. With --max-error, the fastest engine whose mean error stays
+under the bar is reported.
+
+The dataset is a directory of eye crops, as produced by Eye._isolate
+(grayscale, pixels outside the eye white), with a labels.csv file:
+
+    file,x,y
+    eye_0001.png,23,11
+
+    python -m benchmarks.bench_pupil --crops data/eyes
+    python -m benchmarks.bench_pupil --crops data/eyes --threshold 40 --max-error 2.5
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.common import compare, print_table, save_results, summarize
+from gaze_tracking.calibration import Calibration
+from gaze_tracking.pupil_detectors import PUPIL_DETECTORS
+
+
+def load_crops(directory):
+    """Returns [(name, eye frame, (x, y))] from a labeled crop directory"""
+    crops = []
+    with open(os.path.join(directory, "labels.csv"), newline="") as f:
+        for row in csv.DictReader(f):
+            frame = cv2.imread(os.path.join(directory, row["file"]), cv2.IMREAD_GRAYSCALE)
+            if frame is None:
+                print(f"Skipping unreadable crop {row['file']}", file=sys.stderr)
+                continue
+            crops.append((row["file"], frame, (float(row["x"]), float(row["y"]))))
+    return crops
+
+
+def benchmark_engine(detector, crops, thresholds, repeat):
+    times, errors = [], []
+    missed = 0
+    for (_, frame, (label_x, label_y)), threshold in zip(crops, thresholds):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            x, y, _ = detector.locate(frame, threshold)
+            times.append(time.perf_counter() - start)
+        if x is None:
+            missed += 1
+        else:
+            errors.append(float(np.hypot(x - label_x, y - label_y)))
+
+    stats = summarize(times)
+    stats["detection_rate"] = 1.0 - missed / len(crops)
+    stats["mean_error_px"] = float(np.mean(errors)) if errors else None
+    stats["p90_error_px"] = float(np.percentile(errors, 90)) if errors else None
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare pupil detection engines on labeled eye crops.")
+    parser.add_argument("--crops", required=True, help="directory with eye crops and labels.csv")
+    parser.add_argument("--engines", nargs="+", default=sorted(PUPIL_DETECTORS), choices=sorted(PUPIL_DETECTORS))
+    parser.add_argument("--threshold", type=int, default=None,
+                        help="binarization threshold for every crop (default: calibrated per crop)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per crop")
+    parser.add_argument("--max-error", type=float, default=None,
+                        help="accuracy bar (mean error, px) for picking the fastest engine")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/pupil_<time>.json)")
+    parser.add_argument("--compare", help="previous result file to compare against")
+    parser.add_argument("--threshold-regression", type=float, default=0.10,
+                        help="relative slowdown flagged as regression")
+    args = parser.parse_args(argv)
+
+    crops = load_crops(args.crops)
+    if not crops:
+        print("No labeled crops found", file=sys.stderr)
+        return 1
+
+    # Thresholds are chosen like a completed calibration would, outside the timing
+    thresholds = [args.threshold if args.threshold is not None else Calibration.find_best_threshold(frame)
+                  for _, frame, _ in crops]
+
+    case = os.path.basename(os.path.normpath(args.crops))
+    stages = {name: benchmark_engine(PUPIL_DETECTORS[name](), crops, thresholds, args.repeat)
+              for name in args.engines}
+    results = {case: stages}
+
+    print_table(case, stages)
+    for name, stats in stages.items():
+        error = stats["mean_error_px"]
+        print(f"{name:<22} detected {stats['detection_rate']:.1%}  mean error "
+              f"{'n/a' if error is None else f'{error:.2f} px'}")
+
+    if args.max_error is not None:
+        eligible = [(stats["mean_ms"], name) for name, stats in stages.items()
+                    if stats["mean_error_px"] is not None and stats["mean_error_px"] <= args.max_error]
+        if eligible:
+            print(f"\nFastest engine within {args.max_error} px: {min(eligible)[1]}")
+        else:
+            print(f"\nNo engine within {args.max_error} px")
+
+    path = save_results("pupil", results, args.output)
+    print(f"Results written to {path}")
+
+    if args.compare:
+        print()
+        if compare(args.compare, results, threshold=args.threshold_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
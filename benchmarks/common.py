@@ -0,0 +1,134 @@
+"""Shared helpers for the benchmark scripts: timing statistics, synthetic
+video, and JSON result files that can be compared across versions.
+"""
+import datetime
+import json
+import os
+import platform
+import subprocess
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+RESOLUTIONS = {
+    "360p": (640, 360),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+
+
+def summarize(samples, peak_bytes=None):
+    """Returns latency statistics (milliseconds) for a list of durations in seconds"""
+    ms = np.asarray(samples, dtype=float) * 1000.0
+    if ms.size == 0:
+        return {"count": 0}
+    mean = float(ms.mean())
+    stats = {
+        "count": int(ms.size),
+        "mean_ms": mean,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "fps": 1000.0 / mean if mean > 0 else float('inf'),
+    }
+    if peak_bytes is not None:
+        stats["peak_kb"] = peak_bytes / 1024.0
+    return stats
+
+
+def synthetic_frames(width, height, count=60, seed=0):
+    """Yields textured BGR frames with a rectangle moving across the scene,
+    enough to trigger motion detection and exercise every stage
+    """
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    box_w, box_h = max(width // 8, 8), max(height // 4, 8)
+    for i in range(count):
+        frame = background.copy()
+        x = int((width - box_w) * (i % count) / max(count - 1, 1))
+        y = height // 2 - box_h // 2
+        frame[y:y + box_h, x:x + box_w] = (40, 40, 200)
+        yield frame
+
+
+def video_frames(path, count=None, size=None):
+    """Yields frames of a recorded video, optionally resized to `size` (w, h)"""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    read = 0
+    try:
+        while count is None or read < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if size is not None and frame.shape[1::-1] != tuple(size):
+                frame = cv2.resize(frame, size)
+            read += 1
+            yield frame
+    finally:
+        cap.release()
+
+
+def environment():
+    import cv2
+
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                         stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def save_results(name, results, path=None):
+    """Writes `results` with environment metadata; returns the file path"""
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"{name}_{stamp}.json")
+    with open(path, "w") as f:
+        json.dump({"benchmark": name, "environment": environment(), "results": results}, f, indent=2)
+    return path
+
+
+def compare(baseline_path, results, key="mean_ms", threshold=0.10):
+    """Prints the relative change of `key` against a stored result file.
+
+    `results` maps a case name to {stage: stats}. Changes slower than
+    `threshold` are flagged; returns the list of regressed (case, stage).
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    for case, stages in results.items():
+        for stage, stats in stages.items():
+            old = baseline.get(case, {}).get(stage, {}).get(key)
+            new = stats.get(key)
+            if old is None or new is None or old == 0:
+                continue
+            change = (new - old) / old
+            flag = "  REGRESSION" if change > threshold else ""
+            print(f"{case:>12} {stage:<22} {old:9.3f} -> {new:9.3f} {key} ({change:+.1%}){flag}")
+            if flag:
+                regressions.append((case, stage))
+    return regressions
+
+
+def print_table(case, stages):
+    print(f"\n== {case} ==")
+    print(f"{'stage':<22}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'fps':>10}{'peak KB':>10}")
+    for stage, stats in stages.items():
+        if not stats.get("count"):
+            continue
+        print(f"{stage:<22}{stats['mean_ms']:>10.3f}{stats['p50_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+              f"{stats['fps']:>10.1f}{stats.get('peak_kb', float('nan')):>10.1f}")
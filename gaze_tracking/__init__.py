@@ -1 +1,4 @@
 from .gaze_tracking import GazeTracking
+from .face import Face
+from .calibration_store import CalibrationStore
+from .session import SessionRecorder, load_session
@@ -0,0 +1,188 @@
+"""Saccade analysis of many gaze sessions in parallel.
+
+Every session (CSV or binary, see gaze_tracking/session.py) is loaded and
+analysed in a worker process: saccades, fixations, latency of the first
+saccade after each stimulus and saccades intruding into the given intervals.
+The results are gathered into one summary table, one row per session.
+
+Stimuli and intervals are given in seconds from the start of each session:
+
+    python -m gaze_tracking.batch_analysis "sessions/*.csv" --output summary.csv
+    python -m gaze_tracking.batch_analysis sessions/ --stimuli 1.0 5.0 --intervals 2:3 6:7 --workers 8
+"""
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from gaze_tracking.saccades import (count_intrusive_saccades, detect_fixations, detect_saccades,
+                                    saccade_latency_to_stimuli)
+from gaze_tracking.session import load_gaze_series
+
+SESSION_EXTENSIONS = (".csv", ".gses")
+
+SUMMARY_FIELDS = [
+    "file", "samples", "duration_s", "saccades", "saccade_rate_hz", "mean_amplitude",
+    "mean_peak_velocity", "fixations", "mean_fixation_s", "responses", "mean_latency_s",
+    "intrusive_saccades", "load_s", "analysis_s", "error",
+]
+
+
+def find_sessions(patterns):
+    """Session files matching the given directories, globs or paths, sorted"""
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.update(os.path.join(pattern, name) for name in os.listdir(pattern)
+                         if name.lower().endswith(SESSION_EXTENSIONS))
+        else:
+            files.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+    return sorted(files)
+
+
+def _mean(values):
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    return float(values.mean()) if len(values) else None
+
+
+def analyze_session(path, stimuli=(), intervals=(), saccade_params=None, min_fix_dur=0.08, max_latency=1.0):
+    """Summary row of one session; failures are reported in its error field"""
+    summary = dict.fromkeys(SUMMARY_FIELDS)
+    summary["file"] = path
+    try:
+        start = time.perf_counter()
+        times, pos = load_gaze_series(path)
+        loaded = time.perf_counter()
+
+        saccades = detect_saccades(times, pos, as_array=True, **(saccade_params or {}))
+        fixations = detect_fixations(times, pos, saccades, min_fix_dur=min_fix_dur, as_array=True)
+
+        valid = times[np.isfinite(times)]
+        origin = valid[0] if len(valid) else 0.0
+        latencies = saccade_latency_to_stimuli(saccades, [origin + s for s in stimuli], max_latency=max_latency,
+                                               as_array=True)
+        intrusive, _ = count_intrusive_saccades(saccades, [(origin + a, origin + b) for a, b in intervals],
+                                                as_array=True)
+        done = time.perf_counter()
+    except Exception as e:
+        summary["samples"] = 0
+        summary["error"] = f"{type(e).__name__}: {e}"
+        return summary
+
+    duration = float(valid[-1] - valid[0]) if len(valid) > 1 else 0.0
+    summary.update(
+        samples=len(times),
+        duration_s=duration,
+        saccades=len(saccades),
+        saccade_rate_hz=len(saccades) / duration if duration > 0 else None,
+        mean_amplitude=_mean(saccades["amplitude"]),
+        mean_peak_velocity=_mean(saccades["peak_velocity"]),
+        fixations=len(fixations),
+        mean_fixation_s=_mean(fixations["duration"]),
+        responses=int(np.isfinite(latencies).sum()),
+        mean_latency_s=_mean(latencies),
+        intrusive_saccades=int(intrusive),
+        load_s=loaded - start,
+        analysis_s=done - loaded,
+    )
+    return summary
+
+
+def _analyze(job):
+    path, options = job
+    return analyze_session(path, **options)
+
+
+def run_batch(files, workers=None, **options):
+    """Analyses files across a process pool; returns the summary rows in file order"""
+    jobs = [(path, options) for path in files]
+    if workers == 1 or len(jobs) <= 1:
+        return [_analyze(job) for job in jobs]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_analyze, jobs, chunksize=chunksize))
+
+
+def write_summary(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _format(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def print_summary(rows):
+    columns = ["samples", "saccades", "fixations", "responses", "mean_latency_s", "intrusive_saccades"]
+    print(f"{'session':<32}" + "".join(f"{c:>20}" for c in columns))
+    for row in rows:
+        name = os.path.basename(row["file"])[:31]
+        if row["error"]:
+            print(f"{name:<32}  ERROR {row['error']}")
+        else:
+            print(f"{name:<32}" + "".join(f"{_format(row[c]):>20}" for c in columns))
+
+
+def _interval(text):
+    try:
+        start, end = text.split(":")
+        return float(start), float(end)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected START:END in seconds, got {text!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Saccade analysis of many gaze sessions in parallel.")
+    parser.add_argument("inputs", nargs="+", help="session files, directories or glob patterns")
+    parser.add_argument("--output", default="saccade_summary.csv", help="summary table (CSV)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--stimuli", type=float, nargs="*", default=[],
+                        help="stimulus onsets, seconds from the start of each session")
+    parser.add_argument("--max-latency", type=float, default=1.0,
+                        help="slowest saccade (s) still counted as a response to a stimulus")
+    parser.add_argument("--intervals", type=_interval, nargs="*", default=[],
+                        help="START:END windows (seconds from the start) where saccades are intrusive")
+    parser.add_argument("--vel-thresh", type=float, default=0.8)
+    parser.add_argument("--min-dur", type=float, default=0.015)
+    parser.add_argument("--smooth-w", type=int, default=5)
+    parser.add_argument("--min-fix-dur", type=float, default=0.08)
+    args = parser.parse_args(argv)
+
+    files = find_sessions(args.inputs)
+    if not files:
+        print("No session files found", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    rows = run_batch(files, workers=args.workers, stimuli=args.stimuli, intervals=args.intervals,
+                     saccade_params=dict(vel_thresh=args.vel_thresh, min_dur=args.min_dur,
+                                         smooth_w=args.smooth_w),
+                     min_fix_dur=args.min_fix_dur, max_latency=args.max_latency)
+    elapsed = time.perf_counter() - start
+
+    print_summary(rows)
+    write_summary(rows, args.output)
+
+    samples = sum(row["samples"] for row in rows)
+    failed = sum(1 for row in rows if row["error"])
+    print(f"\n{len(rows)} sessions ({failed} failed), {samples} samples in {elapsed:.2f} s: "
+          f"{samples / elapsed if elapsed > 0 else 0:.0f} samples/s")
+    print(f"Summary written to {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 from __future__ import division
 import cv2
+import numpy as np
 from .pupil import Pupil
 
 
@@ -9,15 +10,61 @@ class Calibration(object):
     best binarization threshold value for the person and the webcam.
     """
 
-    def __init__(self):
+    def __init__(self, drift_tolerance=25.0, recalibration_interval=10):
+        """
+        Arguments:
+            drift_tolerance (float): Change of the mean face brightness (0-255) since
+                the calibration was made that triggers a background recalibration
+            recalibration_interval (int): While recalibrating, a new threshold sample
+                is taken once every N frames
+        """
         self.nb_frames = 20
         self.thresholds_left = []
         self.thresholds_right = []
 
+        # Lighting the thresholds were calibrated under, and the current one
+        self.reference_brightness = None
+        self.brightness = None
+        self.drift_tolerance = drift_tolerance
+        self.recalibration_interval = max(int(recalibration_interval), 1)
+        self._pending_samples = 0
+        self._frames = 0
+        # Set when the thresholds were (re)calibrated and should be saved
+        self.changed = False
+
     def is_complete(self):
         """Returns true if the calibration is completed"""
         return len(self.thresholds_left) >= self.nb_frames and len(self.thresholds_right) >= self.nb_frames
 
+    def needs_sample(self):
+        """Returns true if the current frame should be used to evaluate thresholds:
+        always until the calibration is complete, then every few frames while
+        recalibrating after the lighting changed
+        """
+        if not self.is_complete():
+            return True
+        return self._pending_samples > 0 and self._frames % self.recalibration_interval == 0
+
+    def observe_brightness(self, brightness):
+        """Tracks the lighting of the face, once per frame
+
+        Argument:
+            brightness (float): Mean gray level of the face region
+        """
+        self._frames += 1
+        if self.brightness is None:
+            self.brightness = brightness
+        else:
+            self.brightness += 0.1 * (brightness - self.brightness)
+
+        if not self.is_complete() or self._pending_samples > 0:
+            return
+        if self.reference_brightness is None:
+            self.reference_brightness = self.brightness
+        elif abs(self.brightness - self.reference_brightness) > self.drift_tolerance:
+            # Replace the whole sample window, one frame now and then
+            self._pending_samples = self.nb_frames
+
     def threshold(self, side):
         """Returns the threshold value for the given eye.
 
@@ -52,14 +99,17 @@ class Calibration(object):
             eye_frame (numpy.ndarray): Frame of the eye to be analyzed
         """
         average_iris_size = 0.48
-        trials = {}
+        thresholds = np.arange(5, 100, 5)
 
-        for threshold in range(5, 100, 5):
-            iris_frame = Pupil.image_processing(eye_frame, threshold)
-            trials[threshold] = Calibration.iris_size(iris_frame)
+        # The filtering does not depend on the threshold: run it once, then
+        # read the iris size of every candidate from the cumulative histogram
+        # (THRESH_BINARY turns pixels <= threshold black)
+        frame = Pupil.filter_eye(eye_frame)[5:-5, 5:-5]
+        blacks = np.cumsum(np.bincount(frame.ravel(), minlength=256))
+        trials = blacks[thresholds] / frame.size
 
-        best_threshold, iris_size = min(trials.items(), key=(lambda p: abs(p[1] - average_iris_size)))
-        return best_threshold
+        # argmin keeps the lowest threshold on ties, like min() over the trials did
+        return int(thresholds[np.argmin(np.abs(trials - average_iris_size))])
 
     def evaluate(self, eye_frame, side):
         """Improves calibration by taking into consideration the
@@ -70,8 +120,42 @@ class Calibration(object):
             side: Indicates whether it's the left eye (0) or the right eye (1)
         """
         threshold = self.find_best_threshold(eye_frame)
+        was_complete = self.is_complete()
 
         if side == 0:
             self.thresholds_left.append(threshold)
+            del self.thresholds_left[:-self.nb_frames]
         elif side == 1:
             self.thresholds_right.append(threshold)
+            del self.thresholds_right[:-self.nb_frames]
+            if self._pending_samples > 0:
+                self._pending_samples -= 1
+                if self._pending_samples == 0:
+                    self.reference_brightness = self.brightness
+                    self.changed = True
+
+        if not was_complete and self.is_complete():
+            self.reference_brightness = self.brightness
+            self.changed = True
+
+    def to_profile(self):
+        """Returns the calibration as a JSON serializable dict"""
+        return {
+            "thresholds_left": list(self.thresholds_left),
+            "thresholds_right": list(self.thresholds_right),
+            "brightness": self.reference_brightness,
+        }
+
+    def load_profile(self, profile):
+        """Starts from a saved calibration instead of an empty one. If the
+        lighting of the first frames differs from the saved brightness, the
+        thresholds are refreshed in the background
+
+        Argument:
+            profile (dict): As returned by to_profile()
+        """
+        self.thresholds_left = list(profile.get("thresholds_left", []))[-self.nb_frames:]
+        self.thresholds_right = list(profile.get("thresholds_right", []))[-self.nb_frames:]
+        self.reference_brightness = profile.get("brightness")
+        self._pending_samples = 0
+        self.changed = False
@@ -0,0 +1,64 @@
+import datetime
+import json
+import os
+import threading
+
+
+class CalibrationStore(object):
+    """
+    This class keeps calibration profiles in a small JSON file, one per
+    camera and optionally one per person seen by that camera, so a new
+    session starts from warm thresholds instead of calibrating again.
+    """
+
+    def __init__(self, path="calibration_profiles.json"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._profiles = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _key(camera, person=None):
+        return str(camera) if person is None else f"{camera}/{person}"
+
+    def load(self, camera, person=None):
+        """Returns the saved profile of a person on a camera, falling back to the
+        camera's profile, or None
+
+        Arguments:
+            camera: Camera identifier (index, name or URL)
+            person: Optional identifier of the person
+        """
+        with self._lock:
+            profile = None
+            if person is not None:
+                profile = self._profiles.get(self._key(camera, person))
+            if profile is None:
+                profile = self._profiles.get(self._key(camera))
+            return dict(profile) if profile is not None else None
+
+    def save(self, camera, calibration, person=None):
+        """Stores a completed calibration and writes the file
+
+        Arguments:
+            camera: Camera identifier (index, name or URL)
+            calibration (calibration.Calibration): Calibration to store
+            person: Optional identifier of the person
+        """
+        profile = calibration.to_profile()
+        profile["updated"] = datetime.datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            self._profiles[self._key(camera, person)] = profile
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            # Write a temporary file first so a crash never leaves a truncated store
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._profiles, f, indent=2)
+            os.replace(tmp_path, self.path)
@@ -1,32 +1,14 @@
-import csv
-import numpy as np
 from gaze_tracking.saccades import detect_saccades, detect_fixations, saccade_latency_to_stimuli, count_intrusive_saccades
+from gaze_tracking.session import load_gaze_series
 import sys
 
-def load_session_csv(fn):
-    t, g = [], []
-    with open(fn, 'r', newline='') as f:
-        r = csv.DictReader(f)
-        for row in r:
-            try:
-                t.append(float(row['t']))
-            except:
-                t.append(float('nan'))
-            gval = row.get('g_horizontal')
-            if gval is None or gval == '':
-                gval = row.get('left_px', '')
-            try:
-                g.append(float(gval))
-            except:
-                g.append(float('nan'))
-    return np.array(t), np.array(g)
-
 if __name__ == '__main__':
     if len(sys.argv) < 2:
         print("Usage: python examples/run_saccade_analysis.py path/to/session.csv")
+        print("For many sessions at once: python -m gaze_tracking.batch_analysis DIR_OR_GLOB")
         sys.exit(1)
     fn = sys.argv[1]
-    times, pos = load_session_csv(fn)
+    times, pos = load_gaze_series(fn)
     saccades = detect_saccades(times, pos, vel_thresh=0.8, min_dur=0.015, smooth_w=5)
     fixs = detect_fixations(times, pos, saccades, min_fix_dur=0.08)
     print(f"Detected {len(saccades)} saccades, {len(fixs)} fixations")
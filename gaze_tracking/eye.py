@@ -13,14 +13,14 @@ class Eye(object):
     LEFT_EYE_POINTS = [36, 37, 38, 39, 40, 41]
     RIGHT_EYE_POINTS = [42, 43, 44, 45, 46, 47]
 
-    def __init__(self, original_frame, landmarks, side, calibration):
+    def __init__(self, original_frame, landmarks, side, calibration, pupil_detector="contour"):
         self.frame = None
         self.origin = None
         self.center = None
         self.pupil = None
         self.landmark_points = None
 
-        self._analyze(original_frame, landmarks, side, calibration)
+        self._analyze(original_frame, landmarks, side, calibration, pupil_detector)
 
     @staticmethod
     def _middle_point(p1, p2):
@@ -46,21 +46,23 @@ class Eye(object):
         region = region.astype(np.int32)
         self.landmark_points = region
 
-        # Applying a mask to get only the eye
-        height, width = frame.shape[:2]
-        black_frame = np.zeros((height, width), np.uint8)
-        mask = np.full((height, width), 255, np.uint8)
-        cv2.fillPoly(mask, [region], (0, 0, 0))
-        eye = cv2.bitwise_not(black_frame, frame.copy(), mask=mask)
-
         # Cropping on the eye
         margin = 5
-        min_x = np.min(region[:, 0]) - margin
-        max_x = np.max(region[:, 0]) + margin
-        min_y = np.min(region[:, 1]) - margin
-        max_y = np.max(region[:, 1]) + margin
-
-        self.frame = eye[min_y:max_y, min_x:max_x]
+        height, width = frame.shape[:2]
+        min_x = max(np.min(region[:, 0]) - margin, 0)
+        max_x = min(np.max(region[:, 0]) + margin, width)
+        min_y = max(np.min(region[:, 1]) - margin, 0)
+        max_y = min(np.max(region[:, 1]) + margin, height)
+
+        # Applying a mask to get only the eye. The mask is built in the eye's
+        # local coordinates, so only the bounding box is copied and touched:
+        # pixels outside the eye contour become white, the rest are kept.
+        eye = frame[min_y:max_y, min_x:max_x].copy()
+        mask = np.full(eye.shape[:2], 255, np.uint8)
+        cv2.fillPoly(mask, [region - np.array([min_x, min_y], dtype=np.int32)], (0, 0, 0))
+        cv2.bitwise_or(eye, mask, dst=eye)
+
+        self.frame = eye
         self.origin = (min_x, min_y)
 
         height, width = self.frame.shape[:2]
@@ -92,7 +94,7 @@ class Eye(object):
 
         return ratio
 
-    def _analyze(self, original_frame, landmarks, side, calibration):
+    def _analyze(self, original_frame, landmarks, side, calibration, pupil_detector):
         """Detects and isolates the eye in a new frame, sends data to the calibration
         and initializes Pupil object.
 
@@ -101,6 +103,7 @@ class Eye(object):
             landmarks (dlib.full_object_detection): Facial landmarks for the face region
             side: Indicates whether it's the left eye (0) or the right eye (1)
             calibration (calibration.Calibration): Manages the binarization threshold value
+            pupil_detector: Pupil localization engine, a name or a PupilDetector
         """
         if side == 0:
             points = self.LEFT_EYE_POINTS
@@ -112,8 +115,8 @@ class Eye(object):
         self.blinking = self._blinking_ratio(landmarks, points)
         self._isolate(original_frame, landmarks, points)
 
-        if not calibration.is_complete():
+        if calibration.needs_sample():
             calibration.evaluate(self.frame, side)
 
         threshold = calibration.threshold(side)
-        self.pupil = Pupil(self.frame, threshold)
+        self.pupil = Pupil(self.frame, threshold, pupil_detector)
@@ -0,0 +1,143 @@
+from __future__ import division
+import cv2
+from .eye import Eye
+from .calibration import Calibration
+from .face_tracker import FaceTrack
+from .smoothing import PointSmoother
+
+
+class Face(FaceTrack):
+    """
+    This class holds the gaze of one tracked person: the eyes and head pose
+    found on the last frame, plus the calibration and pupil smoothing state
+    that follow the person from frame to frame.
+    """
+
+    def __init__(self, track_id, rect, calibration=None, smoothing="boxcar", smoothing_params=None,
+                 saccade_detector=None):
+        super(Face, self).__init__(track_id, rect)
+        self.landmarks = None
+        self.eye_left = None
+        self.eye_right = None
+        self.head_pose = None
+        self.calibration = calibration if calibration is not None else Calibration()
+
+        # Pupil positions (relative to the eye frame) are smoothed once per
+        # refresh; the resulting frame coordinates are cached for the getters
+        smoothing_params = smoothing_params or {}
+        self.left_smoother = PointSmoother(smoothing, **smoothing_params)
+        self.right_smoother = PointSmoother(smoothing, **smoothing_params)
+        self._left_coords = None
+        self._right_coords = None
+
+        # Optional OnlineSaccadeDetector fed with the horizontal ratio; the
+        # events closed by the last refresh are kept in eye_events
+        self.saccade_detector = saccade_detector
+        self.eye_events = []
+
+    def analyze(self, frame, landmarks, timer, pupil_detector="contour", timestamp=None):
+        """Initializes the Eye objects and updates the pupil smoothing
+
+        Arguments:
+            frame (numpy.ndarray): Grayscale frame
+            landmarks (dlib.full_object_detection): Facial landmarks of this face
+            timer (callable): Returns a context manager timing the named stage
+            pupil_detector: Pupil localization engine, a name or a PupilDetector
+            timestamp (float): Frame time in seconds, for the time-aware smoothers
+        """
+        self.landmarks = landmarks
+
+        # Lighting of the face, so calibration can follow brightness changes
+        height, width = frame.shape[:2]
+        rect = self.rect
+        face_region = frame[max(rect.top(), 0):min(rect.bottom(), height),
+                            max(rect.left(), 0):min(rect.right(), width)]
+        if face_region.size:
+            self.calibration.observe_brightness(cv2.mean(face_region)[0])
+
+        with timer("gaze_eye_left"):
+            self.eye_left = Eye(frame, landmarks, 0, self.calibration, pupil_detector)
+        with timer("gaze_eye_right"):
+            self.eye_right = Eye(frame, landmarks, 1, self.calibration, pupil_detector)
+
+        if self.eye_left.pupil and self.eye_left.pupil.x is not None:
+            self.left_smoother.update(self.eye_left.pupil.x, self.eye_left.pupil.y, timestamp)
+
+        if self.eye_right.pupil and self.eye_right.pupil.x is not None:
+            self.right_smoother.update(self.eye_right.pupil.x, self.eye_right.pupil.y, timestamp)
+
+        self._left_coords = self._right_coords = None
+        if self.pupils_located:
+            self._left_coords = self._to_frame(self.eye_left, self.left_smoother.value)
+            self._right_coords = self._to_frame(self.eye_right, self.right_smoother.value)
+
+        if self.saccade_detector is not None and timestamp is not None:
+            self.eye_events = self.saccade_detector.update(timestamp, self.horizontal_ratio())
+
+    @staticmethod
+    def _to_frame(eye, smoothed):
+        """Adds the smoothed pupil position to the origin (eye corner)"""
+        if smoothed is None:
+            return None
+        return (eye.origin[0] + int(smoothed[0]), eye.origin[1] + int(smoothed[1]))
+
+    @property
+    def pupils_located(self):
+        """Check that the pupils have been located"""
+        try:
+            int(self.eye_left.pupil.x)
+            int(self.eye_left.pupil.y)
+            int(self.eye_right.pupil.x)
+            int(self.eye_right.pupil.y)
+            return True
+        except Exception:
+            return False
+
+    def pupil_left_coords(self):
+        """Returns the smoothed coordinates of the left pupil"""
+        return self._left_coords
+
+    def pupil_right_coords(self):
+        """Returns the smoothed coordinates of the right pupil"""
+        return self._right_coords
+
+    def horizontal_ratio(self):
+        """Returns a number between 0.0 and 1.0 that indicates the
+        horizontal direction of the gaze. The extreme right is 0.0,
+        the center is 0.5 and the extreme left is 1.0
+        """
+        if self.pupils_located:
+            pupil_left = self.eye_left.pupil.x / (self.eye_left.center[0] * 2 - 10)
+            pupil_right = self.eye_right.pupil.x / (self.eye_right.center[0] * 2 - 10)
+            return (pupil_left + pupil_right) / 2
+
+    def vertical_ratio(self):
+        """Returns a number between 0.0 and 1.0 that indicates the
+        vertical direction of the gaze. The extreme top is 0.0,
+        the center is 0.5 and the extreme bottom is 1.0
+        """
+        if self.pupils_located:
+            pupil_left = self.eye_left.pupil.y / (self.eye_left.center[1] * 2 - 10)
+            pupil_right = self.eye_right.pupil.y / (self.eye_right.center[1] * 2 - 10)
+            return (pupil_left + pupil_right) / 2
+
+    def is_right(self):
+        """Returns true if the person is looking to the right"""
+        if self.pupils_located:
+            return self.horizontal_ratio() <= 0.35
+
+    def is_left(self):
+        """Returns true if the person is looking to the left"""
+        if self.pupils_located:
+            return self.horizontal_ratio() >= 0.65
+
+    def is_center(self):
+        """Returns true if the person is looking to the center"""
+        if self.pupils_located:
+            return self.is_right() is not True and self.is_left() is not True
+
+    def is_blinking(self):
+        """Returns true if the person closes their eyes"""
+        if self.pupils_located:
+            blinking_ratio = (self.eye_left.blinking + self.eye_right.blinking) / 2
+            return blinking_ratio > 3.8
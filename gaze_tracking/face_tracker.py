@@ -0,0 +1,280 @@
+import cv2
+import dlib
+import numpy as np
+
+
+def rect_iou(a, b):
+    """Intersection over union of two dlib rectangles"""
+    inter = a.intersect(b)
+    if inter.is_empty():
+        return 0.0
+    union = a.area() + b.area() - inter.area()
+    return inter.area() / union if union else 0.0
+
+
+class FaceTrack(object):
+    """
+    Tracking state of one face: a stable id, its rectangle on the current
+    frame and what FaceTracker needs to follow it between detections.
+    """
+
+    def __init__(self, track_id, rect):
+        self.id = track_id
+        self.rect = rect
+        # detections in a row that did not find this face
+        self.missed = 0
+        # (rect, landmark centroid, landmark spread) at the last detection
+        self.anchor = None
+        # (landmark centroid, landmark spread) on the previous frame
+        self.last_shape = None
+        self.correlation = None
+
+    @property
+    def visible(self):
+        return self.missed == 0
+
+
+class FaceTracker(object):
+    """
+    This class decides where the faces are on each frame and keeps an id for
+    each of them. The full dlib detector (a HOG scan of the whole frame) only
+    runs every `detect_interval` frames, or as soon as tracking looks
+    unreliable; in between, the face rectangles are estimated cheaply from the
+    previous frame.
+    """
+
+    METHODS = ("landmarks", "correlation")
+
+    def __init__(self, detector, detect_interval=1, method="landmarks", min_confidence=7.0, max_motion=0.25,
+                 detect_scale=1.0, search_margin=None, max_faces=None, max_missed=2, match_iou=0.3,
+                 full_scan_interval=3, track_factory=FaceTrack):
+        """
+        Arguments:
+            detector: dlib frontal face detector
+            detect_interval (int): Run the full detector at least once every N frames
+            method (str): "landmarks" moves the last detected rectangle with the
+                previous frame's landmarks, "correlation" uses dlib's correlation tracker
+            min_confidence (float): Correlation tracker peak-to-sidelobe ratio below
+                which the face is considered lost
+            max_motion (float): Landmark displacement or scale change between two
+                frames, relative to the face size, that triggers a new detection
+            detect_scale (float): The detector runs on the frame resized by this factor
+                (e.g. 0.5); rectangles are mapped back to full resolution
+            search_margin (float): When set and faces are being tracked, detections
+                only scan those faces grown by this fraction of their size on each
+                side; the whole frame is scanned when one of them is not found, and
+                every `full_scan_interval` detections to pick up new faces
+            max_faces (int): Largest number of faces tracked at once (None for no limit)
+            max_missed (int): Detections in a row a face may be missing before its
+                track is dropped
+            match_iou (float): Minimum overlap for a detection to continue a track
+            full_scan_interval (int): See `search_margin`
+            track_factory (callable): Creates the track object, called with (id, rect)
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown face tracking method {method!r}, expected one of {self.METHODS}")
+        if not 0 < detect_scale <= 1:
+            raise ValueError(f"detect_scale must be in (0, 1], got {detect_scale}")
+
+        self.detector = detector
+        self.detect_interval = max(int(detect_interval), 1)
+        self.method = method
+        self.min_confidence = min_confidence
+        self.max_motion = max_motion
+        self.detect_scale = detect_scale
+        self.search_margin = search_margin
+        self.max_faces = max_faces
+        self.max_missed = max_missed
+        self.match_iou = match_iou
+        self.full_scan_interval = max(int(full_scan_interval), 1)
+        self.track_factory = track_factory
+
+        self.tracks = []
+        self._next_id = 0
+        self._frames_since_detection = 0
+        self._scans_since_full = 0
+        self._force_detection = True
+
+    def reset(self):
+        """Drops every track; the next frame runs the full detector"""
+        self.tracks = []
+        self._frames_since_detection = 0
+        self._scans_since_full = 0
+        self._force_detection = True
+
+    def locate(self, frame, timer):
+        """Returns the tracks of the faces visible on this frame, oldest first,
+        with their `rect` updated
+
+        Arguments:
+            frame (numpy.ndarray): Grayscale frame
+            timer (callable): Returns a context manager timing the named stage
+        """
+        visible = [track for track in self.tracks if track.visible]
+        if visible and not self._force_detection and self._frames_since_detection + 1 < self.detect_interval:
+            with timer("gaze_face_track"):
+                rects = [self._track(frame, track) for track in visible]
+            if all(rect is not None for rect in rects):
+                for track, rect in zip(visible, rects):
+                    track.rect = rect
+                self._frames_since_detection += 1
+                return visible
+
+        with timer("gaze_face_detect"):
+            rects = self._scan(frame, visible)
+            self._associate(frame, rects)
+
+        self._frames_since_detection = 0
+        visible = [track for track in self.tracks if track.visible]
+        self._force_detection = not visible
+        return visible
+
+    def detect(self, frame, region=None):
+        """Runs the face detector on the downscaled frame, or on a region of it,
+        and returns the face rectangles in full resolution frame coordinates
+
+        Arguments:
+            frame (numpy.ndarray): Grayscale frame
+            region (tuple): Optional (left, top, right, bottom) search area
+        """
+        left, top = 0, 0
+        if region is not None:
+            left, top, right, bottom = region
+            frame = frame[top:bottom, left:right]
+        if self.detect_scale != 1:
+            frame = cv2.resize(frame, None, fx=self.detect_scale, fy=self.detect_scale,
+                               interpolation=cv2.INTER_AREA)
+        faces = self.detector(frame)
+        if self.detect_scale == 1 and region is None:
+            return list(faces)
+
+        scale = 1.0 / self.detect_scale
+        return [dlib.rectangle(int(face.left() * scale) + left, int(face.top() * scale) + top,
+                               int(face.right() * scale) + left, int(face.bottom() * scale) + top)
+                for face in faces]
+
+    def update(self, track, landmarks):
+        """Records the landmarks predicted for a located face, and schedules a
+        new detection if they moved too much to trust the next estimate
+
+        Arguments:
+            track (FaceTrack): Track returned by `locate` for this frame
+            landmarks (dlib.full_object_detection): Facial landmarks for the face region
+        """
+        points = np.array([(p.x, p.y) for p in landmarks.parts()], dtype=float)
+        centroid = points.mean(axis=0)
+        spread = float(np.sqrt(((points - centroid) ** 2).sum(axis=1).mean()))
+        if spread == 0:
+            self._force_detection = True
+            return
+
+        if self._frames_since_detection == 0:
+            track.anchor = (landmarks.rect, centroid, spread)
+        elif track.last_shape is not None:
+            last_centroid, last_spread = track.last_shape
+            motion = np.hypot(*(centroid - last_centroid)) / landmarks.rect.width()
+            if motion > self.max_motion or abs(spread / last_spread - 1) > self.max_motion:
+                self._force_detection = True
+
+        track.last_shape = (centroid, spread)
+
+    def _scan(self, frame, visible):
+        """Detects faces near the tracked ones, or on the whole frame"""
+        self._scans_since_full += 1
+        if self.search_margin is not None and visible and self._scans_since_full < self.full_scan_interval:
+            rects = []
+            for track in visible:
+                found = self.detect(frame, self._search_region(frame, track.rect))
+                if not found:
+                    break
+                rects.extend(found)
+            else:
+                return self._suppress_duplicates(rects)
+
+        self._scans_since_full = 0
+        return self.detect(frame)
+
+    def _suppress_duplicates(self, rects):
+        """Drops rectangles found twice by overlapping search regions"""
+        kept = []
+        for rect in sorted(rects, key=lambda r: r.area(), reverse=True):
+            if all(rect_iou(rect, other) < 0.5 for other in kept):
+                kept.append(rect)
+        return kept
+
+    def _associate(self, frame, rects):
+        """Continues tracks with the detections overlapping them most, starts
+        new tracks for the others and drops faces missing for too long
+        """
+        pairs = sorted(((rect_iou(track.rect, rect), t, r)
+                        for t, track in enumerate(self.tracks) for r, rect in enumerate(rects)),
+                       reverse=True)
+        matched_tracks, matched_rects = set(), set()
+        for overlap, t, r in pairs:
+            if overlap < self.match_iou:
+                break
+            if t in matched_tracks or r in matched_rects:
+                continue
+            matched_tracks.add(t)
+            matched_rects.add(r)
+            self._start(frame, self.tracks[t], rects[r])
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        # Largest faces first, so a max_faces limit keeps the closest people
+        new_rects = sorted((rect for r, rect in enumerate(rects) if r not in matched_rects),
+                           key=lambda rect: rect.area(), reverse=True)
+        for rect in new_rects:
+            if self.max_faces is not None and len(self.tracks) >= self.max_faces:
+                break
+            track = self.track_factory(self._next_id, rect)
+            self._next_id += 1
+            self._start(frame, track, rect)
+            self.tracks.append(track)
+
+    def _start(self, frame, track, rect):
+        track.rect = rect
+        track.missed = 0
+        track.last_shape = None
+        if self.method == "correlation":
+            track.correlation = dlib.correlation_tracker()
+            track.correlation.start_track(frame, rect)
+
+    def _search_region(self, frame, rect):
+        """A face rectangle grown by `search_margin` and clipped to the frame"""
+        height, width = frame.shape[:2]
+        dx = int(rect.width() * self.search_margin)
+        dy = int(rect.height() * self.search_margin)
+        return (max(rect.left() - dx, 0), max(rect.top() - dy, 0),
+                min(rect.right() + dx, width), min(rect.bottom() + dy, height))
+
+    def _track(self, frame, track):
+        """Estimates the face rectangle without running the detector"""
+        if self.method == "correlation":
+            if track.correlation is None or track.correlation.update(frame) < self.min_confidence:
+                return None
+            position = track.correlation.get_position()
+            rect = dlib.rectangle(int(position.left()), int(position.top()),
+                                  int(position.right()), int(position.bottom()))
+        else:
+            if track.anchor is None or track.last_shape is None:
+                return None
+            # The detector rectangle keeps its offset and size relative to the
+            # landmarks, so it follows their centroid and spread
+            anchor_rect, anchor_centroid, anchor_spread = track.anchor
+            centroid, spread = track.last_shape
+            scale = spread / anchor_spread
+            center = anchor_rect.center()
+            cx = centroid[0] + (center.x - anchor_centroid[0]) * scale
+            cy = centroid[1] + (center.y - anchor_centroid[1]) * scale
+            half_w = anchor_rect.width() * scale / 2
+            half_h = anchor_rect.height() * scale / 2
+            rect = dlib.rectangle(int(cx - half_w), int(cy - half_h), int(cx + half_w), int(cy + half_h))
+
+        height, width = frame.shape[:2]
+        if rect.left() < 0 or rect.top() < 0 or rect.right() >= width or rect.bottom() >= height:
+            return None
+        return rect
@@ -1,171 +1,292 @@
 from __future__ import division
 import os
+import contextlib
+import time
 import cv2
 import dlib
-from .eye import Eye
+from .face import Face
 from .calibration import Calibration
 from .head_pose import HeadPose
-from collections import deque
+from .face_tracker import FaceTracker
+from .pupil_detectors import get_pupil_detector
+from .saccades import OnlineSaccadeDetector
+
+_NO_TIMER = contextlib.nullcontext()
+
+
+def _no_timer(name):
+    return _NO_TIMER
 
 
 class GazeTracking(object):
     """
-    This class tracks the user's gaze.
-    It provides useful information like the position of the eyes
-    and pupils and allows to know if the eyes are open or closed
+    This class tracks the gaze of every face in front of the camera.
+    `refresh()` returns one Face per visible person, each with a stable id,
+    its own calibration, pupil smoothing and head pose. The methods below
+    (pupil coordinates, ratios, blinking...) answer for the primary face,
+    the one tracked for the longest time.
     """
 
-    def __init__(self):
+    def __init__(self, metrics=None, detect_interval=1, tracker="landmarks", detect_scale=1.0,
+                 search_margin=None, max_faces=None, max_missed=2, profile_store=None, camera_id="default",
+                 pupil_detector="contour", smoothing="boxcar", smoothing_params=None, saccade_params=None,
+                 recorder=None):
+        """
+        Arguments:
+            metrics: Optional stage timing, any object whose timer(name) returns a context manager
+            detect_interval (int): Run the full face detector at least once every N frames and
+                track the faces in between (1 detects on every frame)
+            tracker (str): How faces are tracked between detections, "landmarks" or "correlation"
+            detect_scale (float): Faces are detected on the grayscale frame resized by this
+                factor; landmarks are still predicted on the full resolution frame
+            search_margin (float): When set, detection first scans the tracked faces grown
+                by this fraction of their size before falling back to the whole frame
+            max_faces (int): Largest number of faces tracked at once (None for no limit)
+            max_missed (int): Detections in a row a face may be missing before its track,
+                calibration and history are dropped
+            profile_store (CalibrationStore): When given, new faces start from the camera's
+                saved calibration and completed calibrations are saved back
+            camera_id: Identifies the camera in the profile store
+            pupil_detector: Pupil localization engine, "contour", "centroid" or a
+                PupilDetector instance; can be changed at runtime
+            smoothing (str): Pupil coordinate filter, "boxcar", "exponential", "one_euro"
+                or "kalman" (see smoothing.py)
+            smoothing_params (dict): Filter parameters, e.g. {"alpha": 0.3} or
+                {"min_cutoff": 1.0, "beta": 0.05}
+            saccade_params (dict): When given (even empty), every face feeds its horizontal
+                ratio to an OnlineSaccadeDetector built with these parameters, and the
+                saccades and fixations closed by each refresh are listed in `eye_events`
+            recorder (SessionRecorder): When given, every refresh appends its samples
+                to this session file
+        """
         self.frame = None
-        self.eye_left = None
-        self.eye_right = None
-        self.calibration = Calibration()
+        self.faces = []
         # head pose estimator
-        self._head_pose_estimator = HeadPose()
-        self.head_pose = None
+        self._head_pose_estimator = HeadPose(stateful=True)
         self.stabilization_history = 5  # Increase to 10 for more smoothness (but more lag)
-        self.left_pupil_history = deque(maxlen=self.stabilization_history)
-        self.right_pupil_history = deque(maxlen=self.stabilization_history)
+        self.smoothing = smoothing
+        self.smoothing_params = dict(smoothing_params or {})
+        if smoothing == "boxcar":
+            self.smoothing_params.setdefault("window", self.stabilization_history)
+        self.saccade_params = saccade_params
+        self.recorder = recorder
 
+        self.metrics = metrics
+        self.profile_store = profile_store
+        self.camera_id = camera_id
+        self.pupil_detector = pupil_detector
 
         # _face_detector is used to detect faces
         self._face_detector = dlib.get_frontal_face_detector()
+        self._face_tracker = FaceTracker(self._face_detector, detect_interval, tracker,
+                                         detect_scale=detect_scale, search_margin=search_margin,
+                                         max_faces=max_faces, max_missed=max_missed,
+                                         track_factory=self._new_face)
 
         # _predictor is used to get facial landmarks of a given face
         cwd = os.path.abspath(os.path.dirname(__file__))
         model_path = os.path.abspath(os.path.join(cwd, "trained_models/shape_predictor_68_face_landmarks.dat"))
         self._predictor = dlib.shape_predictor(model_path)
 
+    def _new_face(self, track_id, rect):
+        calibration = Calibration()
+        if self.profile_store is not None:
+            profile = self.profile_store.load(self.camera_id)
+            if profile is not None:
+                calibration.load_profile(profile)
+        saccade_detector = None
+        if self.saccade_params is not None:
+            saccade_detector = OnlineSaccadeDetector(**self.saccade_params)
+        return Face(track_id, rect, calibration, self.smoothing, self.smoothing_params, saccade_detector)
+
+    def save_calibration(self, person=None, face=None):
+        """Saves the calibration of a face (the primary one by default) to the
+        profile store, for this camera or for a given person on this camera
+        """
+        face = face if face is not None else self.face
+        if self.profile_store is None or face is None or not face.calibration.is_complete():
+            return False
+        self.profile_store.save(self.camera_id, face.calibration, person)
+        return True
+
+    def load_calibration(self, person, face=None):
+        """Replaces the calibration of a face (the primary one by default) with
+        the profile saved for `person`
+        """
+        face = face if face is not None else self.face
+        if self.profile_store is None or face is None:
+            return False
+        profile = self.profile_store.load(self.camera_id, person)
+        if profile is None:
+            return False
+        face.calibration.load_profile(profile)
+        return True
+
+    @property
+    def detect_scale(self):
+        """Factor applied to the frame before face detection"""
+        return self._face_tracker.detect_scale
+
+    @detect_scale.setter
+    def detect_scale(self, scale):
+        if not 0 < scale <= 1:
+            raise ValueError(f"detect_scale must be in (0, 1], got {scale}")
+        self._face_tracker.detect_scale = scale
+
+    @property
+    def pupil_detector(self):
+        """Engine locating the pupil in each eye frame"""
+        return self._pupil_detector
+
+    @pupil_detector.setter
+    def pupil_detector(self, detector):
+        self._pupil_detector = get_pupil_detector(detector)
+
+    @property
+    def face(self):
+        """The primary face (tracked for the longest time), or None"""
+        return self.faces[0] if self.faces else None
+
+    @property
+    def eye_left(self):
+        return self.face.eye_left if self.face else None
+
+    @property
+    def eye_right(self):
+        return self.face.eye_right if self.face else None
+
+    @property
+    def head_pose(self):
+        return self.face.head_pose if self.face else None
+
+    @property
+    def calibration(self):
+        return self.face.calibration if self.face else None
+
+    @property
+    def eye_events(self):
+        """Saccades and fixations of the primary face closed by the last refresh,
+        as (kind, event) pairs
+        """
+        return self.face.eye_events if self.face else []
+
     @property
     def pupils_located(self):
-        """Check that the pupils have been located"""
-        try:
-            int(self.eye_left.pupil.x)
-            int(self.eye_left.pupil.y)
-            int(self.eye_right.pupil.x)
-            int(self.eye_right.pupil.y)
-            return True
-        except Exception:
-            return False
+        """Check that the pupils of the primary face have been located"""
+        return self.face is not None and self.face.pupils_located
+
+    def _analyze(self, timestamp):
+        """Locates the faces, predicts their landmarks and updates each Face"""
+        timer = self.metrics.timer if self.metrics is not None else _no_timer
 
-    def _analyze(self):
-        """Detects the face and initialize Eye objects"""
-        frame = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
-        faces = self._face_detector(frame)
+        with timer("gaze_grayscale"):
+            frame = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+        faces = self._face_tracker.locate(frame, timer)
 
-        try:
-            landmarks = self._predictor(frame, faces[0])
-            self.eye_left = Eye(frame, landmarks, 0, self.calibration)
-            self.eye_right = Eye(frame, landmarks, 1, self.calibration)
+        # One pass over every face on the shared grayscale frame
+        with timer("gaze_landmarks"):
+            shapes = [self._predictor(frame, face.rect) for face in faces]
 
-            if self.eye_left.pupil and self.eye_left.pupil.x is not None:
-                self.left_pupil_history.append((self.eye_left.pupil.x, self.eye_left.pupil.y))
-        
-            if self.eye_right.pupil and self.eye_right.pupil.x is not None:
-                self.right_pupil_history.append((self.eye_right.pupil.x, self.eye_right.pupil.y))
+        for face, landmarks in zip(faces, shapes):
+            self._face_tracker.update(face, landmarks)
+            face.analyze(frame, landmarks, timer, self._pupil_detector, timestamp)
 
-            # estimate head pose (store results)
-            hp = self._head_pose_estimator.estimate(landmarks, self.frame)
-            self.head_pose = hp
+        # estimate head pose of every face (store results), warm-started per track
+        with timer("gaze_head_pose"):
+            poses = self._head_pose_estimator.estimate_many(shapes, self.frame, [face.id for face in faces])
 
-        except IndexError:
-            self.eye_left = None
-            self.eye_right = None
-            self.head_pose = None
+        for face, pose in zip(faces, poses):
+            face.head_pose = pose
+            if face.calibration.changed and self.profile_store is not None:
+                self.profile_store.save(self.camera_id, face.calibration)
+                face.calibration.changed = False
 
-    def refresh(self, frame):
+        self.faces = faces
+
+    def refresh(self, frame, timestamp=None):
         """Refreshes the frame and analyzes it.
 
         Arguments:
             frame (numpy.ndarray): The frame to analyze
+            timestamp (float): Capture time in seconds (defaults to now), used by the
+                time-aware smoothing filters
+
+        Returns:
+            list of Face: The faces visible on this frame, oldest track first
         """
         self.frame = frame
-        self._analyze()
+        timestamp = timestamp if timestamp is not None else time.monotonic()
+        self._analyze(timestamp)
+        if self.recorder is not None:
+            self.recorder.record(self.faces, timestamp)
+        return self.faces
 
     def pupil_left_coords(self):
         """Returns the smoothed coordinates of the left pupil"""
-        if self.pupils_located and len(self.left_pupil_history) > 0:
-            # Calculate average of stored history
-            avg_x = int(sum(p[0] for p in self.left_pupil_history) / len(self.left_pupil_history))
-            avg_y = int(sum(p[1] for p in self.left_pupil_history) / len(self.left_pupil_history))
-            
-            # Add to origin (eye corner)
-            x = self.eye_left.origin[0] + avg_x
-            y = self.eye_left.origin[1] + avg_y
-            return (x, y)
-        
+        if self.face:
+            return self.face.pupil_left_coords()
+
     def pupil_right_coords(self):
         """Returns the smoothed coordinates of the right pupil"""
-        if self.pupils_located and len(self.right_pupil_history) > 0:
-            # Calculate average of stored history
-            avg_x = int(sum(p[0] for p in self.right_pupil_history) / len(self.right_pupil_history))
-            avg_y = int(sum(p[1] for p in self.right_pupil_history) / len(self.right_pupil_history))
-            
-            # Add to origin (eye corner)
-            x = self.eye_right.origin[0] + avg_x
-            y = self.eye_right.origin[1] + avg_y
-            return (x, y)
-        
+        if self.face:
+            return self.face.pupil_right_coords()
 
     def horizontal_ratio(self):
         """Returns a number between 0.0 and 1.0 that indicates the
         horizontal direction of the gaze. The extreme right is 0.0,
         the center is 0.5 and the extreme left is 1.0
         """
-        if self.pupils_located:
-            pupil_left = self.eye_left.pupil.x / (self.eye_left.center[0] * 2 - 10)
-            pupil_right = self.eye_right.pupil.x / (self.eye_right.center[0] * 2 - 10)
-            return (pupil_left + pupil_right) / 2
+        if self.face:
+            return self.face.horizontal_ratio()
 
     def vertical_ratio(self):
         """Returns a number between 0.0 and 1.0 that indicates the
         vertical direction of the gaze. The extreme top is 0.0,
         the center is 0.5 and the extreme bottom is 1.0
         """
-        if self.pupils_located:
-            pupil_left = self.eye_left.pupil.y / (self.eye_left.center[1] * 2 - 10)
-            pupil_right = self.eye_right.pupil.y / (self.eye_right.center[1] * 2 - 10)
-            return (pupil_left + pupil_right) / 2
+        if self.face:
+            return self.face.vertical_ratio()
 
     def is_right(self):
         """Returns true if the user is looking to the right"""
-        if self.pupils_located:
-            return self.horizontal_ratio() <= 0.35
+        if self.face:
+            return self.face.is_right()
 
     def is_left(self):
         """Returns true if the user is looking to the left"""
-        if self.pupils_located:
-            return self.horizontal_ratio() >= 0.65
+        if self.face:
+            return self.face.is_left()
 
     def is_center(self):
         """Returns true if the user is looking to the center"""
-        if self.pupils_located:
-            return self.is_right() is not True and self.is_left() is not True
+        if self.face:
+            return self.face.is_center()
 
     def is_blinking(self):
         """Returns true if the user closes his eyes"""
-        if self.pupils_located:
-            blinking_ratio = (self.eye_left.blinking + self.eye_right.blinking) / 2
-            return blinking_ratio > 3.8
+        if self.face:
+            return self.face.is_blinking()
 
     def annotated_frame(self):
         """Returns the main frame with pupils highlighted"""
         frame = self.frame.copy()
 
-        if self.pupils_located:
-            color = (0, 255, 0)
-            x_left, y_left = self.pupil_left_coords()
-            x_right, y_right = self.pupil_right_coords()
-            cv2.line(frame, (x_left - 5, y_left), (x_left + 5, y_left), color)
-            cv2.line(frame, (x_left, y_left - 5), (x_left, y_left + 5), color)
-            cv2.line(frame, (x_right - 5, y_right), (x_right + 5, y_right), color)
-            cv2.line(frame, (x_right, y_right - 5), (x_right, y_right + 5), color)
+        for face in self.faces:
+            if face.pupils_located:
+                color = (0, 255, 0)
+                x_left, y_left = face.pupil_left_coords()
+                x_right, y_right = face.pupil_right_coords()
+                cv2.line(frame, (x_left - 5, y_left), (x_left + 5, y_left), color)
+                cv2.line(frame, (x_left, y_left - 5), (x_left, y_left + 5), color)
+                cv2.line(frame, (x_right - 5, y_right), (x_right + 5, y_right), color)
+                cv2.line(frame, (x_right, y_right - 5), (x_right, y_right + 5), color)
 
-        # draw head-pose axes if available
-        if self.head_pose:
-            frame = HeadPose.draw_axes(frame, self.head_pose.get('nose_point'), self.head_pose.get('axis_points'))
+            # draw head-pose axes if available
+            if face.head_pose:
+                frame = HeadPose.draw_axes(frame, face.head_pose.get('nose_point'), face.head_pose.get('axis_points'))
 
-            # optionally overlay numeric angles
+        # optionally overlay numeric angles of the primary face
+        if self.head_pose:
             ang = self.head_pose.get('angles', {})
             cv2.putText(frame, f"Yaw:{ang.get('yaw',0):.1f}", (20, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,0), 2)
             cv2.putText(frame, f"Pitch:{ang.get('pitch',0):.1f}", (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,0), 2)
@@ -9,7 +9,18 @@ class HeadPose(object):
     using a 3D model and cv2.solvePnP.
     """
 
-    def __init__(self):
+    # dlib indices for the chosen image points
+    IMAGE_INDICES = [30, 8, 36, 45, 48, 54]  # nose tip, chin, left eye corner, right eye corner, left mouth, right mouth
+
+    def __init__(self, stateful=False, max_reprojection_error=8.0):
+        """
+        Arguments:
+            stateful (bool): Start each solve from the previous pose of the same face
+                instead of from scratch; a cold solve is run again when the warm
+                result reprojects worse than `max_reprojection_error`
+            max_reprojection_error (float): Mean distance (pixels) between the
+                landmarks and the reprojected model points accepted from a warm solve
+        """
         # 3D model points in mm (generic face model)
         self.model_points = np.array([
             (0.0, 0.0, 0.0),             # Nose tip
@@ -20,6 +31,19 @@ class HeadPose(object):
             (150.0, -150.0, -125.0)      # Right mouth corner
         ], dtype=float)
 
+        # Model points followed by the 3 axis ends (for visualization), so the
+        # nose (model point 0), the axes and the reprojection error all come
+        # out of a single projectPoints call
+        axis_3d = np.array([[100.0, 0.0, 0.0],
+                            [0.0, 100.0, 0.0],
+                            [0.0, 0.0, 100.0]])
+        self._projected_points = np.vstack([self.model_points, axis_3d])
+
+        self.stateful = stateful
+        self.max_reprojection_error = max_reprojection_error
+        self._intrinsics = {}
+        self._previous = {}
+
     @staticmethod
     def _landmark_to_np(landmarks, indices):
         pts = []
@@ -28,48 +52,108 @@ class HeadPose(object):
             pts.append((p.x, p.y))
         return np.array(pts, dtype=float)
 
-    def estimate(self, landmarks, frame):
+    def _camera(self, frame):
+        """Camera matrix and distortion coefficients, cached per frame size"""
+        size = frame.shape[:2]
+        intrinsics = self._intrinsics.get(size)
+        if intrinsics is None:
+            focal_length = size[1]
+            center = (size[1] / 2, size[0] / 2)
+            camera_matrix = np.array([
+                [focal_length, 0, center[0]],
+                [0, focal_length, center[1]],
+                [0, 0, 1]
+            ], dtype=float)
+            dist_coeffs = np.zeros((4, 1))  # assume no lens distortion
+            intrinsics = self._intrinsics[size] = (camera_matrix, dist_coeffs)
+        return intrinsics
+
+    def forget(self, key=None):
+        """Drops the previous pose of a face (all faces if key is None)"""
+        if key is None:
+            self._previous.clear()
+        else:
+            self._previous.pop(key, None)
+
+    def estimate(self, landmarks, frame, key=None):
         """
         landmarks: dlib.full_object_detection
         frame: numpy.ndarray (color or gray) used only for size
+        key: identifies the face across frames in stateful mode (e.g. its track id)
         Returns:
           dict {
             'rvec': rvec,
             'tvec': tvec,
             'angles': {'yaw':..., 'pitch':..., 'roll':...},
             'nose_point': (x,y),
-            'axis_points': [(x1,y1),(x2,y2),(x3,y3)]
+            'axis_points': [(x1,y1),(x2,y2),(x3,y3)],
+            'reprojection_error': mean distance in pixels
           }
         and draws axis points projection based on the nose.
         """
-        # dlib indices for the chosen image points
-        IMAGE_INDICES = [30, 8, 36, 45, 48, 54]  # nose tip, chin, left eye corner, right eye corner, left mouth, right mouth
-        image_points = self._landmark_to_np(landmarks, IMAGE_INDICES)
-
-        size = frame.shape
-        focal_length = size[1]
-        center = (size[1] / 2, size[0] / 2)
-        camera_matrix = np.array([
-            [focal_length, 0, center[0]],
-            [0, focal_length, center[1]],
-            [0, 0, 1]
-        ], dtype=float)
-        dist_coeffs = np.zeros((4, 1))  # assume no lens distortion
+        camera_matrix, dist_coeffs = self._camera(frame)
+        return self._estimate(landmarks, camera_matrix, dist_coeffs, key)
 
-        success, rvec, tvec = cv2.solvePnP(self.model_points, image_points, camera_matrix, dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE)
+    def estimate_many(self, landmarks_list, frame, keys=None):
+        """Estimates the pose of every face of a frame. In stateful mode,
+        previous poses of faces whose key is not given are dropped.
+
+        Arguments:
+            landmarks_list (list): dlib.full_object_detection of each face
+            frame (numpy.ndarray): Used only for size
+            keys (list): Identifier of each face across frames (e.g. track ids)
+
+        Returns:
+            list: One pose dict (see estimate) or None per face
+        """
+        camera_matrix, dist_coeffs = self._camera(frame)
+        if keys is None:
+            keys = [None] * len(landmarks_list)
+        poses = [self._estimate(landmarks, camera_matrix, dist_coeffs, key)
+                 for landmarks, key in zip(landmarks_list, keys)]
+        if self.stateful:
+            for key in set(self._previous) - set(keys):
+                del self._previous[key]
+        return poses
+
+    def _solve(self, image_points, camera_matrix, dist_coeffs, guess=None):
+        if guess is None:
+            success, rvec, tvec = cv2.solvePnP(self.model_points, image_points, camera_matrix, dist_coeffs,
+                                               flags=cv2.SOLVEPNP_ITERATIVE)
+        else:
+            success, rvec, tvec = cv2.solvePnP(self.model_points, image_points, camera_matrix, dist_coeffs,
+                                               rvec=guess[0].copy(), tvec=guess[1].copy(),
+                                               useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE)
         if not success:
             return None
+        projected, _ = cv2.projectPoints(self._projected_points, rvec, tvec, camera_matrix, dist_coeffs)
+        projected = projected.reshape(-1, 2)
+        n = len(self.model_points)
+        error = float(np.linalg.norm(projected[:n] - image_points, axis=1).mean())
+        return rvec, tvec, projected, error
+
+    def _estimate(self, landmarks, camera_matrix, dist_coeffs, key):
+        image_points = self._landmark_to_np(landmarks, self.IMAGE_INDICES)
+
+        solution = None
+        previous = self._previous.get(key) if self.stateful else None
+        if previous is not None:
+            solution = self._solve(image_points, camera_matrix, dist_coeffs, guess=previous)
+            if solution is not None and solution[3] > self.max_reprojection_error:
+                solution = None
+        if solution is None:
+            solution = self._solve(image_points, camera_matrix, dist_coeffs)
+        if solution is None:
+            self._previous.pop(key, None)
+            return None
 
-        # Project 3 axis points (for visualization)
-        axis_3d = np.float32([[100.0, 0.0, 0.0],
-                              [0.0, 100.0, 0.0],
-                              [0.0, 0.0, 100.0]])
-        nose_3d = np.float32([[0.0, 0.0, 0.0]])
-        nose_point_2d, _ = cv2.projectPoints(nose_3d, rvec, tvec, camera_matrix, dist_coeffs)
-        axis_points_2d, _ = cv2.projectPoints(axis_3d, rvec, tvec, camera_matrix, dist_coeffs)
+        rvec, tvec, projected, error = solution
+        if self.stateful:
+            self._previous[key] = (rvec, tvec)
 
-        nose_point = (int(nose_point_2d[0][0][0]), int(nose_point_2d[0][0][1]))
-        axis_points = [(int(p[0][0]), int(p[0][1])) for p in axis_points_2d]
+        n = len(self.model_points)
+        nose_point = (int(projected[0][0]), int(projected[0][1]))
+        axis_points = [(int(p[0]), int(p[1])) for p in projected[n:]]
 
         # Rotation vector -> rotation matrix -> Euler angles
         R, _ = cv2.Rodrigues(rvec)
@@ -98,7 +182,8 @@ class HeadPose(object):
             'angles': angles,
             'nose_point': nose_point,
             'axis_points': axis_points,
-            'image_points': image_points
+            'image_points': image_points,
+            'reprojection_error': error
         }
 
     @staticmethod
@@ -0,0 +1,116 @@
+import numpy as np
+import cv2
+
+
+class PupilDetector(object):
+    """
+    Interface of the pupil localization engines. `locate` receives the
+    isolated eye frame (pixels outside the eye are white) and the calibrated
+    binarization threshold, and returns (x, y, iris_frame) where x and y are
+    None when no pupil was found.
+    """
+
+    name = None
+
+    def locate(self, eye_frame, threshold):
+        raise NotImplementedError
+
+
+class ContourPupilDetector(PupilDetector):
+    """
+    Bilateral filter, erosion and binarization, then the centroid of the
+    most circular dark contour. Robust to eyelashes and reflections, but the
+    filter and the contour loop dominate the per-eye cost.
+    """
+
+    name = "contour"
+
+    @staticmethod
+    def filter_eye(eye_frame):
+        kernel = np.ones((3, 3), np.uint8)
+        new_frame = cv2.bilateralFilter(eye_frame, 15, 75, 75)
+        return cv2.erode(new_frame, kernel, iterations=3)
+
+    def locate(self, eye_frame, threshold):
+        iris_frame = cv2.threshold(self.filter_eye(eye_frame), threshold, 255, cv2.THRESH_BINARY)[1]
+        contours, _ = cv2.findContours(iris_frame, cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)[-2:]
+
+        # --- NEW LOGIC: Find the most circular contour ---
+        if not contours:
+            return None, None, iris_frame
+
+        best_contour = None
+        min_circularity_error = float('inf')
+
+        for c in contours:
+            area = cv2.contourArea(c)
+            perimeter = cv2.arcLength(c, True)
+            if area < 5: continue # Ignore noise
+            if perimeter == 0: continue
+
+            # Circularity = 4*pi*Area / Perimeter^2. Perfect circle = 1.0
+            circularity = (4 * np.pi * area) / (perimeter * perimeter)
+
+            # We want circularity close to 1.0
+            error = abs(1.0 - circularity)
+
+            if error < min_circularity_error:
+                min_circularity_error = error
+                best_contour = c
+
+        if best_contour is None:
+            # Fallback to old method if no circle found
+            contours = sorted(contours, key=cv2.contourArea)
+            best_contour = contours[-2] if len(contours) > 1 else contours[0]
+
+        try:
+            moments = cv2.moments(best_contour)
+            return int(moments['m10'] / moments['m00']), int(moments['m01'] / moments['m00']), iris_frame
+        except (IndexError, ZeroDivisionError):
+            return None, None, iris_frame
+
+
+class CentroidPupilDetector(PupilDetector):
+    """
+    Centroid of the dark pixels of a lightly blurred eye patch: one small
+    Gaussian blur, one threshold and one moments call, no contour search.
+    Much cheaper than the contour engine, less robust to dark eyelashes and
+    shadows at the eye corners.
+    """
+
+    name = "centroid"
+
+    def __init__(self, blur=5):
+        self.blur = blur
+
+    def locate(self, eye_frame, threshold):
+        frame = cv2.GaussianBlur(eye_frame, (self.blur, self.blur), 0) if self.blur > 1 else eye_frame
+        # Same convention as the contour engine: the iris is black in iris_frame
+        iris_frame = cv2.threshold(frame, threshold, 255, cv2.THRESH_BINARY)[1]
+
+        # Moments of the dark pixels are those of the whole patch (closed form)
+        # minus those of the white pixels
+        height, width = iris_frame.shape[:2]
+        white = cv2.moments(iris_frame, binaryImage=True)
+        m00 = width * height - white['m00']
+        if m00 <= 0:
+            return None, None, iris_frame
+        m10 = height * width * (width - 1) / 2 - white['m10']
+        m01 = width * height * (height - 1) / 2 - white['m01']
+        return int(m10 / m00), int(m01 / m00), iris_frame
+
+
+PUPIL_DETECTORS = {
+    ContourPupilDetector.name: ContourPupilDetector,
+    CentroidPupilDetector.name: CentroidPupilDetector,
+}
+
+
+def get_pupil_detector(detector):
+    """Returns a detector instance from a registered name, or the detector itself"""
+    if isinstance(detector, PupilDetector):
+        return detector
+    try:
+        return PUPIL_DETECTORS[detector]()
+    except KeyError:
+        raise ValueError(f"Unknown pupil detector {detector!r}, expected one of {sorted(PUPIL_DETECTORS)}")
@@ -1,18 +1,51 @@
+import math
+from collections import deque
+
 import numpy as np
 
+# Structured array layouts returned with as_array=True; the fields match the
+# keys of the dicts returned by default
+SACCADE_DTYPE = np.dtype([
+    ('onset_idx', np.int64), ('offset_idx', np.int64),
+    ('onset_t', float), ('offset_t', float), ('duration', float),
+    ('peak_velocity', float), ('amplitude', float),
+])
+FIXATION_DTYPE = np.dtype([
+    ('start_idx', np.int64), ('end_idx', np.int64),
+    ('start_t', float), ('end_t', float), ('duration', float),
+    ('pos_mean', float),
+])
+
+def _runs(active):
+    """First and last index of every run of True values"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], active.view(np.int8), [0]))))
+    return edges[0::2], edges[1::2] - 1
+
+def _to_dicts(events):
+    names = events.dtype.names
+    return [dict(zip(names, row)) for row in events.tolist()]
+
+def _saccade_bounds(saccades):
+    """Onset and offset indices from a list of dicts or a structured array"""
+    if isinstance(saccades, np.ndarray):
+        return saccades['onset_idx'].astype(np.int64), saccades['offset_idx'].astype(np.int64)
+    onset_idx = np.array([s['onset_idx'] for s in saccades], dtype=np.int64)
+    offset_idx = np.array([s['offset_idx'] for s in saccades], dtype=np.int64)
+    return onset_idx, offset_idx
+
 def _moving_average(x, w=5):
     if w <= 1:
         return x
     kernel = np.ones(w) / w
     return np.convolve(x, kernel, mode='same')
 
-def detect_saccades(times, pos, vel_thresh=0.5, min_dur=0.02, smooth_w=5):
+def detect_saccades(times, pos, vel_thresh=0.5, min_dur=0.02, smooth_w=5, as_array=False):
     times = np.asarray(times, dtype=float)
     pos = np.asarray(pos, dtype=float)
 
     mask = np.isfinite(pos) & np.isfinite(times)
     if mask.sum() < 3:
-        return []
+        return np.empty(0, dtype=SACCADE_DTYPE) if as_array else []
 
     pos_interp = np.copy(pos)
     if not np.all(mask):
@@ -25,83 +58,264 @@ def detect_saccades(times, pos, vel_thresh=0.5, min_dur=0.02, smooth_w=5):
     vel = np.abs(np.gradient(pos_s, times))
 
     active = vel > vel_thresh
-    saccades = []
-    i = 0
-    N = len(active)
-    while i < N:
-        if not active[i]:
-            i += 1
-            continue
-        start = i
-        while i < N and active[i]:
-            i += 1
-        end = i - 1
-        duration = times[end] - times[start]
-        if duration >= min_dur:
-            amp = pos_s[end] - pos_s[start]
-            peak = float(np.max(vel[start:end+1]))
-            saccades.append({
-                'onset_idx': int(start),
-                'offset_idx': int(end),
-                'onset_t': float(times[start]),
-                'offset_t': float(times[end]),
-                'duration': float(duration),
-                'peak_velocity': peak,
-                'amplitude': float(amp)
-            })
-    return saccades
-
-def detect_fixations(times, pos, saccades, min_fix_dur=0.08):
+    start, end = _runs(active)
+    duration = times[end] - times[start]
+    keep = duration >= min_dur
+    start, end, duration = start[keep], end[keep], duration[keep]
+
+    # Peak of each run: reduceat over [start, end+1) pairs, the odd slots
+    # (gaps between runs) are discarded; the padding keeps end+1 in range
+    bounds = np.column_stack([start, end + 1]).ravel()
+    peak = np.maximum.reduceat(np.append(vel, 0.0), bounds)[::2] if start.size else np.zeros(0)
+
+    saccades = np.empty(start.size, dtype=SACCADE_DTYPE)
+    saccades['onset_idx'] = start
+    saccades['offset_idx'] = end
+    saccades['onset_t'] = times[start]
+    saccades['offset_t'] = times[end]
+    saccades['duration'] = duration
+    saccades['peak_velocity'] = peak
+    saccades['amplitude'] = pos_s[end] - pos_s[start]
+    return saccades if as_array else _to_dicts(saccades)
+
+def detect_fixations(times, pos, saccades, min_fix_dur=0.08, as_array=False):
     times = np.asarray(times, dtype=float)
     pos = np.asarray(pos, dtype=float)
     N = len(times)
 
-    sac_mask = np.zeros(N, dtype=bool)
-    for s in saccades:
-        sac_mask[s['onset_idx']:s['offset_idx']+1] = True
-
-    fixations = []
-    i = 0
-    while i < N:
-        if sac_mask[i]:
-            i += 1
-            continue
-        start = i
-        while i < N and not sac_mask[i]:
-            i += 1
-        end = i - 1
-        duration = times[end] - times[start]
-        if duration >= min_fix_dur:
-            fixations.append({
-                'start_idx': int(start),
-                'end_idx': int(end),
-                'start_t': float(times[start]),
-                'end_t': float(times[end]),
-                'duration': float(duration),
-                'pos_mean': float(np.nanmean(pos[start:end+1]))
-            })
-    return fixations
-
-def saccade_latency_to_stimuli(saccades, stimuli_times, max_latency=1.0):
-    onsets = np.array([s['onset_t'] for s in saccades]) if saccades else np.array([])
-    latencies = []
-    for stim in stimuli_times:
-        if onsets.size == 0:
-            latencies.append(float('nan'))
-            continue
-        idx = np.searchsorted(onsets, stim, side='left')
-        if idx < len(onsets) and onsets[idx] - stim <= max_latency:
-            latencies.append(float(onsets[idx] - stim))
+    onset_idx, offset_idx = _saccade_bounds(saccades)
+    # +1 at each onset, -1 after each offset: samples inside a saccade have a
+    # positive running count
+    delta = np.zeros(N + 1, dtype=np.int64)
+    np.add.at(delta, onset_idx, 1)
+    np.add.at(delta, offset_idx + 1, -1)
+    sac_mask = np.cumsum(delta[:N]) > 0
+
+    start, end = _runs(~sac_mask)
+    duration = times[end] - times[start]
+    keep = duration >= min_fix_dur
+    start, end, duration = start[keep], end[keep], duration[keep]
+
+    fixations = np.empty(start.size, dtype=FIXATION_DTYPE)
+    fixations['start_idx'] = start
+    fixations['end_idx'] = end
+    fixations['start_t'] = times[start]
+    fixations['end_t'] = times[end]
+    fixations['duration'] = duration
+    # One nanmean per fixation (not per sample) keeps the means bit-identical
+    fixations['pos_mean'] = [np.nanmean(pos[a:b + 1]) for a, b in zip(start, end)]
+    return fixations if as_array else _to_dicts(fixations)
+
+def _onset_times(saccades):
+    """Onset times from a list of dicts or a structured array"""
+    if isinstance(saccades, np.ndarray):
+        return saccades['onset_t'].astype(float)
+    return np.array([s['onset_t'] for s in saccades], dtype=float)
+
+def saccade_latency_to_stimuli(saccades, stimuli_times, max_latency=1.0, as_array=False):
+    onsets = _onset_times(saccades)
+    stimuli = np.asarray(stimuli_times, dtype=float).ravel()
+    latencies = np.full(stimuli.size, np.nan)
+    if onsets.size:
+        # First onset at or after each stimulus, for all stimuli at once
+        idx = np.searchsorted(onsets, stimuli, side='left')
+        found = np.flatnonzero(idx < onsets.size)
+        delay = onsets[idx[found]] - stimuli[found]
+        in_time = delay <= max_latency
+        latencies[found[in_time]] = delay[in_time]
+    return latencies if as_array else latencies.tolist()
+
+def count_intrusive_saccades(saccades, intervals, as_array=False):
+    onsets = _onset_times(saccades)
+    intervals = np.asarray(intervals, dtype=float).reshape(-1, 2)
+    # Onsets within [a, b]: first index past b minus first index at a
+    counts = (np.searchsorted(onsets, intervals[:, 1], side='right')
+              - np.searchsorted(onsets, intervals[:, 0], side='left'))
+    counts = np.maximum(counts, 0)
+    return int(counts.sum()), counts if as_array else counts.tolist()
+
+class OnlineSaccadeDetector(object):
+    """Incremental version of detect_saccades + detect_fixations for live use.
+
+    Samples are fed one at a time with update(t, pos); each call returns the
+    (kind, event) pairs, kind being 'saccade' or 'fixation', that closed with
+    that sample. The events have the same fields as the batch functions and
+    match them up to float rounding. A sample is classified `delay` samples
+    after it arrives: the centered moving average needs (smooth_w - 1) // 2
+    later samples and the central difference one more. Call flush() at the
+    end of the session to close the last events.
+
+    Memory is bounded (a few samples for smoothing, at most `max_gap` samples
+    while waiting for the end of a run of missing positions) and each sample
+    costs O(smooth_w). Gaps longer than `max_gap` are filled with the last
+    valid position instead of being interpolated.
+    """
+
+    def __init__(self, vel_thresh=0.5, min_dur=0.02, smooth_w=5, min_fix_dur=0.08, max_gap=120):
+        self.vel_thresh = vel_thresh
+        self.min_dur = min_dur
+        self.smooth_w = max(int(smooth_w), 1)
+        self.min_fix_dur = min_fix_dur
+        self.max_gap = max_gap
+        self._lag = (self.smooth_w - 1) // 2
+        self.delay = self._lag + 1
+        self.reset()
+
+    def reset(self):
+        self._count = 0
+        self._last_valid = None
+        self._gap = deque()
+        self._window = deque()
+        self._window_total = 0.0
+        self._centers = deque()
+        self._smoothed = deque(maxlen=3)
+        self._run = None
+        self._fixation = None
+
+    def update(self, t, pos):
+        """Adds one sample (time in seconds, position e.g. the horizontal ratio,
+        NaN when unknown) and returns the events it closed
+        """
+        events = []
+        index = self._count
+        self._count += 1
+        pos = float('nan') if pos is None else float(pos)
+
+        if not math.isfinite(pos):
+            self._gap.append((index, t, pos))
+            if len(self._gap) > self.max_gap:
+                held = self._last_valid[1] if self._last_valid is not None else 0.0
+                while self._gap:
+                    i, ti, raw = self._gap.popleft()
+                    self._smooth(i, ti, raw, held, events)
+            return events
+
+        # Linear interpolation over the missing samples (np.interp in the batch
+        # version); before the first valid sample, its value is used
+        while self._gap:
+            i, ti, raw = self._gap.popleft()
+            if self._last_valid is None:
+                value = pos
+            else:
+                t0, p0 = self._last_valid
+                value = p0 + (pos - p0) * (ti - t0) / (t - t0) if t != t0 else pos
+            self._smooth(i, ti, raw, value, events)
+        self._last_valid = (t, pos)
+        self._smooth(index, t, pos, pos, events)
+        return events
+
+    def flush(self):
+        """Closes the session and returns the remaining events"""
+        events = []
+        held = self._last_valid[1] if self._last_valid is not None else 0.0
+        while self._gap:
+            i, ti, raw = self._gap.popleft()
+            self._smooth(i, ti, raw, held, events)
+
+        # The batch moving average pads the end of the signal with zeros
+        while self._centers:
+            i, ti, raw = self._centers.popleft()
+            self._differentiate(i, ti, raw, self._slide(0.0), events)
+
+        # Last sample: backward difference, like np.gradient at the edge
+        if len(self._smoothed) >= 2:
+            (_, t0, _, f0), (i, t1, raw, f1) = self._smoothed[-2], self._smoothed[-1]
+            self._classify(i, t1, raw, f1, abs((f1 - f0) / (t1 - t0)), events)
+
+        if self._run is not None:
+            self._close_run(events)
+        self._close_fixation(events)
+        self.reset()
+        return events
+
+    def _slide(self, value):
+        """Moves the smoothing window by one sample and returns its mean (running sum, O(1))"""
+        self._window.append(value)
+        self._window_total += value
+        if len(self._window) > self.smooth_w:
+            self._window_total -= self._window.popleft()
+        return self._window_total / self.smooth_w
+
+    def _smooth(self, i, t, raw, value, events):
+        smoothed = self._slide(value) if self.smooth_w > 1 else value
+        self._centers.append((i, t, raw))
+        if len(self._centers) > self._lag:
+            i, t, raw = self._centers.popleft()
+            self._differentiate(i, t, raw, smoothed, events)
+
+    def _differentiate(self, i, t, raw, f, events):
+        s = self._smoothed
+        s.append((i, t, raw, f))
+        if len(s) == 2:
+            # First sample: forward difference
+            (i0, t0, raw0, f0), (_, t1, _, f1) = s
+            self._classify(i0, t0, raw0, f0, abs((f1 - f0) / (t1 - t0)), events)
+        elif len(s) == 3:
+            # Same second order central difference as np.gradient
+            (_, t0, _, f0), (i1, t1, raw1, f1), (_, t2, _, f2) = s
+            dx1, dx2 = t1 - t0, t2 - t1
+            a = -(dx2) / (dx1 * (dx1 + dx2))
+            b = (dx2 - dx1) / (dx1 * dx2)
+            c = dx1 / (dx2 * (dx1 + dx2))
+            self._classify(i1, t1, raw1, f1, abs(a * f0 + b * f1 + c * f2), events)
+
+    def _classify(self, i, t, raw, pos_s, vel, events):
+        if vel > self.vel_thresh:
+            run = self._run
+            if run is None:
+                run = self._run = {'start_i': i, 'start_t': t, 'start_pos': pos_s, 'peak': vel,
+                                   'raw_sum': 0.0, 'raw_n': 0, 'confirmed': False}
+            run['peak'] = max(run['peak'], vel)
+            run['end_i'], run['end_t'], run['end_pos'] = i, t, pos_s
+            if math.isfinite(raw):
+                run['raw_sum'] += raw
+                run['raw_n'] += 1
+            if not run['confirmed'] and t - run['start_t'] >= self.min_dur:
+                # Long enough to be a saccade: the fixation before it is over
+                run['confirmed'] = True
+                self._close_fixation(events)
         else:
-            latencies.append(float('nan'))
-    return latencies
-
-def count_intrusive_saccades(saccades, intervals):
-    onsets = np.array([s['onset_t'] for s in saccades]) if saccades else np.array([])
-    counts = []
-    for (a,b) in intervals:
-        if onsets.size == 0:
-            counts.append(0)
+            if self._run is not None:
+                self._close_run(events)
+            self._extend_fixation(i, i, t, t, raw if math.isfinite(raw) else 0.0, int(math.isfinite(raw)))
+
+    def _close_run(self, events):
+        run, self._run = self._run, None
+        if run['confirmed']:
+            events.append(('saccade', {
+                'onset_idx': run['start_i'],
+                'offset_idx': run['end_i'],
+                'onset_t': run['start_t'],
+                'offset_t': run['end_t'],
+                'duration': run['end_t'] - run['start_t'],
+                'peak_velocity': run['peak'],
+                'amplitude': run['end_pos'] - run['start_pos'],
+            }))
+        else:
+            # Too short for a saccade: the samples belong to the fixation
+            self._extend_fixation(run['start_i'], run['end_i'], run['start_t'], run['end_t'],
+                                  run['raw_sum'], run['raw_n'])
+
+    def _extend_fixation(self, start_i, end_i, start_t, end_t, raw_sum, raw_n):
+        fixation = self._fixation
+        if fixation is None:
+            self._fixation = [start_i, end_i, start_t, end_t, raw_sum, raw_n]
         else:
-            counts.append(int(np.sum((onsets >= a) & (onsets <= b))))
-    return int(np.sum(counts)), counts
\ No newline at end of file
+            fixation[1], fixation[3] = end_i, end_t
+            fixation[4] += raw_sum
+            fixation[5] += raw_n
+
+    def _close_fixation(self, events):
+        fixation, self._fixation = self._fixation, None
+        if fixation is None:
+            return
+        start_i, end_i, start_t, end_t, raw_sum, raw_n = fixation
+        if end_t - start_t >= self.min_fix_dur:
+            events.append(('fixation', {
+                'start_idx': start_i,
+                'end_idx': end_i,
+                'start_t': start_t,
+                'end_t': end_t,
+                'duration': end_t - start_t,
+                'pos_mean': raw_sum / raw_n if raw_n else float('nan'),
+            }))
@@ -0,0 +1,257 @@
+"""Compact binary gaze sessions.
+
+A session file is a small header followed by fixed-width records, one per
+face per frame (one record with face_id -1 and NaN values when no face is
+visible, so gaps stay visible to the saccade detector):
+
+    8 bytes   magic b"GAZESES1"
+    4 bytes   little-endian uint32, header length in bytes (from the start)
+    JSON      {"version", "fields": [[name, dtype], ...], "metadata": {...}},
+              space padded so records start on a 64 byte boundary
+    records   packed little-endian, see SESSION_DTYPE
+
+The record count is not stored: it follows from the file size, so a session
+interrupted by a crash is still readable up to its last flushed chunk.
+load_session() memory-maps the records, and every column (session['t'],
+session['horizontal_ratio']...) is a NumPy view on the file, with no parsing
+and nothing loaded until it is read.
+
+Sessions recorded as CSV (columns t and g_horizontal, or left_px) are read by
+load_session_csv(), which parses large blocks of rows at once instead of one
+row at a time.
+"""
+import csv
+import datetime
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"GAZESES1"
+VERSION = 1
+
+SESSION_DTYPE = np.dtype([
+    ("t", "<f8"),
+    ("face_id", "<i4"),
+    ("pupil_left_x", "<f4"),
+    ("pupil_left_y", "<f4"),
+    ("pupil_right_x", "<f4"),
+    ("pupil_right_y", "<f4"),
+    ("horizontal_ratio", "<f4"),
+    ("vertical_ratio", "<f4"),
+    ("blink_ratio", "<f4"),
+    ("yaw", "<f4"),
+    ("pitch", "<f4"),
+    ("roll", "<f4"),
+])
+
+_NAN = float('nan')
+
+
+class SessionRecorder(object):
+    """Appends gaze samples to a session file in buffered chunks
+
+    Arguments:
+        path (str): Session file to create (overwritten if it exists)
+        chunk_rows (int): Records buffered in memory between two writes
+        metadata (dict): JSON serializable information stored in the header
+    """
+
+    def __init__(self, path, chunk_rows=1024, metadata=None):
+        self.path = path
+        self.rows = 0
+        self._buffer = np.zeros(max(int(chunk_rows), 1), dtype=SESSION_DTYPE)
+        self._pending = 0
+
+        header = {
+            "version": VERSION,
+            "fields": [[name, SESSION_DTYPE[name].str] for name in SESSION_DTYPE.names],
+            "metadata": dict(metadata or {}, created=datetime.datetime.now().isoformat(timespec="seconds")),
+        }
+        body = json.dumps(header).encode("utf-8")
+        length = len(MAGIC) + 4 + len(body)
+        padding = -length % 64
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "wb")
+        self._file.write(MAGIC + struct.pack("<I", length + padding) + body + b" " * padding)
+
+    def append(self, t, face_id=-1, **values):
+        """Adds one record; fields that are not given are NaN"""
+        row = self._buffer[self._pending]
+        row["t"] = t
+        row["face_id"] = face_id
+        for name in SESSION_DTYPE.names[2:]:
+            value = values.get(name)
+            row[name] = _NAN if value is None else value
+        self._pending += 1
+        self.rows += 1
+        if self._pending == len(self._buffer):
+            self.flush()
+
+    def record(self, faces, t):
+        """Adds the samples of one GazeTracking refresh
+
+        Arguments:
+            faces (list): Faces returned by GazeTracking.refresh
+            t (float): Frame timestamp in seconds
+        """
+        if not faces:
+            self.append(t)
+            return
+        for face in faces:
+            left = face.pupil_left_coords() or (None, None)
+            right = face.pupil_right_coords() or (None, None)
+            blink = None
+            if face.eye_left is not None and face.eye_right is not None:
+                if face.eye_left.blinking is not None and face.eye_right.blinking is not None:
+                    blink = (face.eye_left.blinking + face.eye_right.blinking) / 2
+            angles = face.head_pose.get('angles', {}) if face.head_pose else {}
+            self.append(t, face.id,
+                        pupil_left_x=left[0], pupil_left_y=left[1],
+                        pupil_right_x=right[0], pupil_right_y=right[1],
+                        horizontal_ratio=face.horizontal_ratio(), vertical_ratio=face.vertical_ratio(),
+                        blink_ratio=blink,
+                        yaw=angles.get('yaw'), pitch=angles.get('pitch'), roll=angles.get('roll'))
+
+    def flush(self):
+        if self._pending:
+            self._file.write(self._buffer[:self._pending].tobytes())
+            self._pending = 0
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def read_header(path):
+    """Returns the JSON header of a session file"""
+    with open(path, "rb") as f:
+        prefix = f.read(len(MAGIC) + 4)
+        if len(prefix) < len(MAGIC) + 4 or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a gaze session file")
+        length = struct.unpack("<I", prefix[len(MAGIC):])[0]
+        header = json.loads(f.read(length - len(prefix)).decode("utf-8"))
+    header["header_length"] = length
+    return header
+
+
+def load_session(path, face_id=None):
+    """Memory-maps a session file as a structured array (one field per column)
+
+    Arguments:
+        path (str): Session file
+        face_id (int): Keep only the records of this face (this copies them)
+    """
+    header = read_header(path)
+    dtype = np.dtype([(name, code) for name, code in header["fields"]])
+    rows = (os.path.getsize(path) - header["header_length"]) // dtype.itemsize
+    if rows == 0:
+        session = np.zeros(0, dtype=dtype)
+    else:
+        session = np.memmap(path, dtype=dtype, mode="r", offset=header["header_length"], shape=(rows,))
+    if face_id is not None:
+        session = session[session["face_id"] == face_id]
+    return session
+
+
+def _to_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return _NAN
+
+
+def _parse_column(fields):
+    """Float array from an array of CSV fields; empty or invalid fields are NaN"""
+    fields = np.char.strip(fields)
+    try:
+        return np.where(fields == "", "nan", fields).astype(float)
+    except ValueError:
+        return np.array([_to_float(field) if field else _NAN for field in fields.tolist()])
+
+
+def _parse_rows(lines, width, columns):
+    """Selected columns of a block of CSV lines, as arrays of strings"""
+    if all('"' not in line and line.count(",") == width - 1 for line in lines):
+        table = np.array(",".join(lines).split(",")).reshape(len(lines), width)
+    else:
+        # Quoted fields or ragged rows: let the csv module split them
+        rows = [row + [""] * (width - len(row)) for row in csv.reader(lines)]
+        table = np.array([row[:width] for row in rows]).reshape(len(rows), width)
+    return [table[:, c] if c is not None else np.full(len(table), "") for c in columns]
+
+
+def load_session_csv(path, chunk_bytes=1 << 23):
+    """Times and horizontal gaze positions of a CSV session
+
+    The position is g_horizontal, or left_px on rows where g_horizontal is
+    empty; fields that are not numbers are NaN. The file is read in blocks of
+    `chunk_bytes`, so memory stays bounded on very large files.
+
+    Arguments:
+        path (str): CSV file with a header row
+        chunk_bytes (int): Size of each block read from the file
+
+    Returns:
+        tuple: (times, positions) as float arrays
+    """
+    times, positions = [], []
+    with open(path, "r", newline="") as f:
+        header = next(csv.reader([f.readline()]), [])
+        header = [name.strip() for name in header]
+        if "t" not in header:
+            raise ValueError(f"{path} has no 't' column")
+        columns = [header.index(name) if name in header else None for name in ("t", "g_horizontal", "left_px")]
+
+        remainder = ""
+        while True:
+            block = f.read(chunk_bytes)
+            text = remainder + block
+            if block:
+                cut = text.rfind("\n") + 1
+                text, remainder = text[:cut], text[cut:]
+            lines = [line for line in text.splitlines() if line]
+            if lines:
+                t, g, left = _parse_rows(lines, len(header), columns)
+                times.append(_parse_column(t))
+                g = np.where(np.char.strip(g) == "", left, g)
+                positions.append(_parse_column(g))
+            if not block:
+                break
+
+    if not times:
+        return np.zeros(0), np.zeros(0)
+    return np.concatenate(times), np.concatenate(positions)
+
+
+def load_gaze_series(path, face_id=None):
+    """Times and horizontal gaze ratio of a binary or CSV session
+
+    Arguments:
+        path (str): Session file written by SessionRecorder, or a CSV session
+        face_id (int): Face of a binary session to read (default: the face
+            with the most records)
+    """
+    with open(path, "rb") as f:
+        binary = f.read(len(MAGIC)) == MAGIC
+    if not binary:
+        return load_session_csv(path)
+
+    session = load_session(path)
+    if face_id is None:
+        ids, counts = np.unique(session["face_id"][session["face_id"] >= 0], return_counts=True)
+        face_id = ids[np.argmax(counts)] if len(ids) else -1
+    # Records without a face are kept: their NaN values mark the gaps
+    session = session[(session["face_id"] == face_id) | (session["face_id"] == -1)]
+    return session["t"].astype(float), session["horizontal_ratio"].astype(float)
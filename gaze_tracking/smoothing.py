@@ -0,0 +1,183 @@
+"""Constant-time smoothing filters for pupil coordinates.
+
+Each filter smooths one axis incrementally: `update(value, t)` folds in a
+new sample in O(1) and returns the filtered value. `PointSmoother` runs one
+filter per axis and keeps the last result, so reading it is free.
+
+- boxcar: mean of the last `window` samples, kept as a running sum
+- exponential: exponential moving average
+- one_euro: One-Euro filter, smooths heavily at rest and follows fast
+  movements (saccades) with little lag
+- kalman: constant-velocity Kalman filter
+"""
+from __future__ import division
+import math
+from collections import deque
+
+
+class BoxcarFilter(object):
+
+    def __init__(self, window=5):
+        self.window = max(int(window), 1)
+        self._samples = deque()
+        self._total = 0
+
+    def reset(self):
+        self._samples.clear()
+        self._total = 0
+
+    def update(self, value, t=None):
+        self._samples.append(value)
+        self._total += value
+        if len(self._samples) > self.window:
+            self._total -= self._samples.popleft()
+        return self._total / len(self._samples)
+
+
+class ExponentialFilter(object):
+
+    def __init__(self, alpha=0.5):
+        self.alpha = alpha
+        self._value = None
+
+    def reset(self):
+        self._value = None
+
+    def update(self, value, t=None):
+        if self._value is None:
+            self._value = float(value)
+        else:
+            self._value += self.alpha * (value - self._value)
+        return self._value
+
+
+class OneEuroFilter(object):
+    """Casiez et al., "1 Euro Filter" (CHI 2012)
+
+    Arguments:
+        min_cutoff (float): Cutoff frequency (Hz) at rest, lower is smoother
+        beta (float): How fast the cutoff rises with speed, higher is less laggy
+        d_cutoff (float): Cutoff frequency (Hz) of the speed estimate
+        rate (float): Sample rate (Hz) assumed when no timestamps are given
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.05, d_cutoff=1.0, rate=30.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.rate = rate
+        self.reset()
+
+    def reset(self):
+        self._value = None
+        self._speed = 0.0
+        self._t = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def update(self, value, t=None):
+        if self._value is None:
+            self._value, self._t = float(value), t
+            return self._value
+
+        dt = t - self._t if t is not None and self._t is not None and t > self._t else 1.0 / self.rate
+        self._t = t
+
+        speed = (value - self._value) / dt
+        self._speed += self._alpha(self.d_cutoff, dt) * (speed - self._speed)
+        cutoff = self.min_cutoff + self.beta * abs(self._speed)
+        self._value += self._alpha(cutoff, dt) * (value - self._value)
+        return self._value
+
+
+class KalmanFilter(object):
+    """Constant-velocity Kalman filter on one axis
+
+    Arguments:
+        process_noise (float): Acceleration noise, higher follows changes faster
+        measurement_noise (float): Variance of the measured position (pixels^2)
+        rate (float): Sample rate (Hz) assumed when no timestamps are given
+    """
+
+    def __init__(self, process_noise=500.0, measurement_noise=4.0, rate=30.0):
+        self.q = process_noise
+        self.r = measurement_noise
+        self.rate = rate
+        self.reset()
+
+    def reset(self):
+        self._x = None
+        self._v = 0.0
+        self._t = None
+        self._p = [[0.0, 0.0], [0.0, 0.0]]
+
+    def update(self, value, t=None):
+        if self._x is None:
+            self._x, self._v, self._t = float(value), 0.0, t
+            self._p = [[self.r, 0.0], [0.0, self.r * self.rate ** 2]]
+            return self._x
+
+        dt = t - self._t if t is not None and self._t is not None and t > self._t else 1.0 / self.rate
+        self._t = t
+
+        # Predict: x += v dt, P = F P F' + Q
+        (p00, p01), (p10, p11) = self._p
+        self._x += self._v * dt
+        p00 += dt * (p10 + p01) + dt * dt * p11 + self.q * dt ** 4 / 4
+        p01 += dt * p11 + self.q * dt ** 3 / 2
+        p10 += dt * p11 + self.q * dt ** 3 / 2
+        p11 += self.q * dt * dt
+
+        # Correct with the measured position
+        s = p00 + self.r
+        k0, k1 = p00 / s, p10 / s
+        residual = value - self._x
+        self._x += k0 * residual
+        self._v += k1 * residual
+        self._p = [[(1 - k0) * p00, (1 - k0) * p01], [p10 - k1 * p00, p11 - k1 * p01]]
+        return self._x
+
+
+SMOOTHERS = {
+    "boxcar": BoxcarFilter,
+    "exponential": ExponentialFilter,
+    "one_euro": OneEuroFilter,
+    "kalman": KalmanFilter,
+}
+
+
+class PointSmoother(object):
+    """Smooths (x, y) points with one filter per axis and caches the result
+
+    Arguments:
+        method (str): One of SMOOTHERS
+        **params: Passed to the filter of each axis
+    """
+
+    def __init__(self, method="boxcar", **params):
+        try:
+            factory = SMOOTHERS[method]
+        except KeyError:
+            raise ValueError(f"Unknown smoothing method {method!r}, expected one of {sorted(SMOOTHERS)}")
+        self.method = method
+        self._x = factory(**params)
+        self._y = factory(**params)
+        self.value = None
+
+    def reset(self):
+        self._x.reset()
+        self._y.reset()
+        self.value = None
+
+    def update(self, x, y, t=None):
+        """Adds a sample and returns the smoothed (x, y)
+
+        Arguments:
+            x, y: Measured position
+            t (float): Sample time in seconds, used by the time-aware filters
+        """
+        self.value = (self._x.update(x, t), self._y.update(y, t))
+        return self.value
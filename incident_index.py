@@ -0,0 +1,156 @@
+"""SQLite index of the incident recordings.
+
+One row per recording, written when it starts and completed when it stops,
+with the camera, start/end time, duration, number of frames, peak motion
+area, the YOLO classes seen and gaze flags raised while it ran. Classes are
+also stored one per row in a separate table, so listing by time range or by
+class uses an index instead of scanning the recordings directory.
+
+Times are Unix timestamps (seconds). The connection is shared between the
+analysis thread (writes) and the UI thread (queries) behind a lock.
+"""
+import datetime
+import os
+import re
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    camera TEXT,
+    start_time REAL NOT NULL,
+    end_time REAL,
+    duration REAL,
+    frames INTEGER NOT NULL DEFAULT 0,
+    peak_motion_area REAL NOT NULL DEFAULT 0,
+    classes TEXT NOT NULL DEFAULT '',
+    gaze_flags TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS incidents_start ON incidents (start_time);
+CREATE TABLE IF NOT EXISTS incident_classes (
+    class TEXT NOT NULL,
+    incident_id INTEGER NOT NULL REFERENCES incidents (id) ON DELETE CASCADE,
+    PRIMARY KEY (class, incident_id)
+) WITHOUT ROWID;
+"""
+
+COLUMNS = ("id", "path", "camera", "start_time", "end_time", "duration", "frames",
+           "peak_motion_area", "classes", "gaze_flags")
+
+_FILENAME_TIME = re.compile(r"incident_(\d{8}_\d{6})")
+
+
+class IncidentIndex(object):
+    """Incident metadata stored in an SQLite file
+
+    Arguments:
+        path (str): Database file, created with its tables if missing
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.created = not os.path.exists(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # WAL keeps the UI's reads from waiting on writes, and a recording
+        # start/stop never waits for an fsync
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def start(self, path, camera, start_time):
+        """Adds a recording that just started and returns its id"""
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT OR REPLACE INTO incidents (path, camera, start_time) VALUES (?, ?, ?)",
+                (path, camera, start_time))
+            return cursor.lastrowid
+
+    def finish(self, incident_id, end_time, frames=0, peak_motion_area=0.0, classes=(), gaze_flags=()):
+        """Completes a recording with what was seen while it ran"""
+        classes = sorted(set(classes))
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE incidents SET end_time = ?, duration = ? - start_time, frames = ?, peak_motion_area = ?, "
+                "classes = ?, gaze_flags = ? WHERE id = ?",
+                (end_time, end_time, frames, peak_motion_area, ",".join(classes),
+                 ",".join(sorted(set(gaze_flags))), incident_id))
+            self._db.executemany("INSERT OR IGNORE INTO incident_classes (class, incident_id) VALUES (?, ?)",
+                                 [(label, incident_id) for label in classes])
+
+    @staticmethod
+    def _where(start, end, label, camera):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("start_time >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("start_time < ?")
+            params.append(end)
+        if label:
+            clauses.append("id IN (SELECT incident_id FROM incident_classes WHERE class = ?)")
+            params.append(label)
+        if camera:
+            clauses.append("camera = ?")
+            params.append(camera)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, start=None, end=None, label=None, camera=None, limit=50, offset=0):
+        """Recordings that started in [start, end), newest first, one page at a time
+
+        Arguments:
+            start, end (float): Time range (Unix time); None leaves that side open
+            label (str): Only recordings where YOLO saw this class
+            camera (str): Only recordings of this camera
+            limit (int): Page size
+            offset (int): Rows skipped before the page
+
+        Returns:
+            list: One dict per recording, with the keys of COLUMNS
+        """
+        where, params = self._where(start, end, label, camera)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM incidents{where} ORDER BY start_time DESC, id DESC "
+                "LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def count(self, start=None, end=None, label=None, camera=None):
+        where, params = self._where(start, end, label, camera)
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM incidents{where}", params).fetchone()[0]
+
+    def classes(self):
+        """Every class seen in at least one recording, sorted"""
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT DISTINCT class FROM incident_classes ORDER BY class")]
+
+    def import_directory(self, directory):
+        """Indexes the .avi files of `directory` that are not in the index yet.
+
+        Only the start time (from the file name, else the file time) is known
+        for them. Meant for recordings made before the index existed.
+        """
+        with self._lock:
+            known = {row[0] for row in self._db.execute("SELECT path FROM incidents")}
+        rows = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not name.endswith(".avi") or path in known:
+                continue
+            match = _FILENAME_TIME.search(name)
+            if match:
+                start_time = datetime.datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+            else:
+                start_time = os.path.getmtime(path)
+            rows.append((path, start_time))
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR IGNORE INTO incidents (path, start_time) VALUES (?, ?)", rows)
+        return len(rows)
@@ -0,0 +1,223 @@
+"""Lightweight runtime metrics for the security pipeline.
+
+`Metrics` keeps per-stage latency histograms (plus a rolling window for
+percentiles), counters and gauges, and renders them in the Prometheus text
+format. `MetricsServer` serves that text on a local HTTP port.
+
+When created with `enabled=False` every call returns immediately and
+`timer()` hands back a shared no-op context manager, so instrumentation
+can stay in the hot path at near-zero cost.
+"""
+import contextlib
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Upper bounds (seconds) of the Prometheus latency buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class LatencyHistogram(object):
+    """Cumulative bucket counts for Prometheus and a rolling window for percentiles"""
+
+    def __init__(self, window=300):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+
+class _Timer(object):
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics(object):
+    """Thread-safe registry of stage latencies, counters and gauges.
+
+    Arguments:
+        enabled (bool): When False, all recording calls are no-ops
+        window (int): Number of recent samples kept per stage for percentiles
+        prefix (str): Prepended to every exported metric name
+    """
+
+    def __init__(self, enabled=True, window=300, prefix="security"):
+        self.enabled = enabled
+        self.window = window
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._callbacks = {}
+        self._frame_times = deque(maxlen=window)
+
+    def timer(self, name):
+        """Context manager that records the duration of its block under `name`"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram(self.window)
+            histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def register_callback(self, name, callback, kind="gauge", **labels):
+        """Registers a counter or gauge whose value is read from `callback()` at export time"""
+        with self._lock:
+            self._callbacks[(name, tuple(sorted(labels.items())))] = (kind, callback)
+
+    def mark_frame(self):
+        """Records the completion of one processed frame (drives the fps gauge)"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        key = ("frames_processed_total", ())
+        with self._lock:
+            self._frame_times.append(now)
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def fps(self):
+        with self._lock:
+            if len(self._frame_times) < 2:
+                return 0.0
+            span = self._frame_times[-1] - self._frame_times[0]
+            return (len(self._frame_times) - 1) / span if span > 0 else 0.0
+
+    def summary(self):
+        """Returns {stage: (p50_ms, p99_ms)} over the rolling window, for overlays"""
+        with self._lock:
+            histograms = list(self._histograms.items())
+            recent = {name: list(h.recent) for name, h in histograms}
+        summary = {}
+        for name, samples in recent.items():
+            if samples:
+                p50, p99 = np.percentile(samples, [50, 99])
+                summary[name] = (p50 * 1000.0, p99 * 1000.0)
+        return summary
+
+    def render_prometheus(self):
+        """Renders every metric in the Prometheus text exposition format"""
+        p = self.prefix
+        lines = []
+        fps = self.fps()
+        with self._lock:
+            lines.append(f"# HELP {p}_stage_latency_seconds Latency of each pipeline stage")
+            lines.append(f"# TYPE {p}_stage_latency_seconds histogram")
+            for name, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, h.bucket_counts):
+                    cumulative += count
+                    lines.append(f'{p}_stage_latency_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{p}_stage_latency_seconds_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'{p}_stage_latency_seconds_sum{{stage="{name}"}} {h.total}')
+                lines.append(f'{p}_stage_latency_seconds_count{{stage="{name}"}} {h.count}')
+
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            callbacks = list(self._callbacks.items())
+
+        for key, (kind, callback) in callbacks:
+            try:
+                value = callback()
+            except Exception:
+                continue
+            (counters if kind == "counter" else gauges)[key] = value
+        gauges[("fps", ())] = fps
+        lines.extend(_render_family(p, counters, "counter"))
+        lines.extend(_render_family(p, gauges, "gauge"))
+        return "\n".join(lines) + "\n"
+
+
+def _render_family(prefix, values, kind):
+    """One TYPE line per metric name, followed by all of its label sets"""
+    lines = []
+    current = None
+    for (name, labels), value in sorted(values.items()):
+        if name != current:
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            current = name
+        lines.append(f"{prefix}_{name}{_format_labels(labels)} {value}")
+    return lines
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class MetricsServer(object):
+    """Serves `metrics.render_prometheus()` at http://host:port/metrics from a daemon thread"""
+
+    def __init__(self, metrics, port=9100, host="127.0.0.1"):
+        registry = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
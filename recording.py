@@ -0,0 +1,345 @@
+"""Background video writer for incident recordings.
+
+`RecordingWriter` owns one camera's cv2.VideoWriter on its own thread.
+Opening, writing and closing a recording only queue a command, so MJPG
+encoding and disk stalls never hold up capture or inference.
+
+Frames wait in a bounded queue. What happens when the disk falls behind
+and the queue is full is set by the overflow policy:
+
+- drop_oldest: the oldest queued frame is discarded (the default)
+- drop_newest: the incoming frame is discarded
+- block: the caller waits up to `block_timeout`, then drops the incoming frame
+
+Queued frames are copied into buffers that are recycled once written, so
+callers may reuse their frame right away and steady-state recording does not
+allocate.
+
+`PreRollBuffer` keeps the last seconds of frames before a recording starts,
+downscaled (or JPEG compressed) in a fixed, preallocated block of memory.
+Raw frames are stored without any allocation; in JPEG mode, cv2.imencode
+still allocates one short-lived output array per frame.
+Passed to `RecordingWriter.open`, its frames open the new recording.
+"""
+import contextlib
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class RecordingWriter(object):
+    """Encodes the recordings of one camera on a background thread.
+
+    Arguments:
+        name (str): Camera name, used for the thread name
+        max_queue (int): Frames waiting to be encoded before the overflow policy applies
+        overflow (str): One of OVERFLOW_POLICIES
+        block_timeout (float): Longest wait (seconds) of write() under the block policy
+        fourcc (str): Codec of the recordings
+        fps (float): Frame rate written in the recordings
+        metrics (Metrics): When given, encoding time is recorded as the "record_encode" stage
+        on_closed (callable): Called from the writer thread as on_closed(path) once a
+            recording is complete on disk
+    """
+
+    DEFAULT_FPS = 20.0
+
+    def __init__(self, name, max_queue=64, overflow="drop_oldest", block_timeout=0.5,
+                 fourcc="MJPG", fps=DEFAULT_FPS, metrics=None, on_closed=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        self.name = name
+        self.max_queue = max(int(max_queue), 1)
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.fps = fps
+        self.metrics = metrics
+        self.on_closed = on_closed
+
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.recordings = 0
+        self.errors = 0
+
+        self._commands = deque()
+        self._queued_frames = 0
+        self._free = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def __len__(self):
+        with self._cond:
+            return self._queued_frames
+
+    def _send(self, command):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"writer-{self.name}", daemon=True)
+                self._thread.start()
+            self._commands.append(command)
+            self._cond.notify_all()
+
+    def open(self, path, frame_size, preroll=None):
+        """Starts a new recording (closing the current one) without waiting for the file
+
+        Arguments:
+            path (str): Video file to create
+            frame_size (tuple): (width, height) of the recording
+            preroll (PreRollBuffer): Frames written first, before the next queued frame;
+                the buffer is taken until the writer has copied them out
+        """
+        token = preroll.take() if preroll is not None else None
+        self._send(("open", (path, tuple(frame_size), preroll, token)))
+
+    def close(self):
+        """Ends the current recording once its queued frames are written"""
+        self._send(("close", None))
+
+    def write(self, frame):
+        """Queues a copy of `frame` for the current recording.
+
+        Returns False when the frame was dropped by the overflow policy.
+        """
+        with self._cond:
+            if self._queued_frames >= self.max_queue:
+                if self.overflow == "drop_oldest":
+                    self._drop_oldest()
+                elif self.overflow == "block":
+                    self._cond.wait_for(lambda: self._queued_frames < self.max_queue, self.block_timeout)
+                if self._queued_frames >= self.max_queue:
+                    self.frames_dropped += 1
+                    return False
+            # Reserve the slot now so the copy below can run outside the lock
+            self._queued_frames += 1
+            buffer = self._free.pop() if self._free else None
+
+        if buffer is None or buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+            buffer = np.empty_like(frame)
+        np.copyto(buffer, frame)
+        self._send(("frame", buffer))
+        return True
+
+    def _drop_oldest(self):
+        for i, (kind, buffer) in enumerate(self._commands):
+            if kind == "frame":
+                del self._commands[i]
+                self._queued_frames -= 1
+                self.frames_dropped += 1
+                self._free.append(buffer)
+                return
+
+    def shutdown(self, timeout=10.0):
+        """Writes the queued frames, closes the recording and stops the thread.
+
+        Returns False when the thread is still writing after `timeout`; it is
+        then kept, so a later command cannot start a second writer thread.
+        """
+        if self._thread is None:
+            return True
+        self._send(("stop", None))
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return False
+        self._thread = None
+        return True
+
+    def _run(self):
+        writer = None
+        path = None
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._commands)
+                kind, arg = self._commands.popleft()
+
+            if kind == "frame":
+                if writer is not None:
+                    timer = self.metrics.timer("record_encode") if self.metrics is not None else _NULL_TIMER
+                    with timer:
+                        writer.write(arg)
+                with self._cond:
+                    if writer is not None:
+                        self.frames_written += 1
+                    else:
+                        self.frames_dropped += 1
+                    self._queued_frames -= 1
+                    self._free.append(arg)
+                    self._cond.notify_all()
+                continue
+
+            if writer is not None:
+                writer.release()
+                writer = None
+                if self.on_closed is not None:
+                    self.on_closed(path)
+            if kind == "open":
+                path, frame_size, preroll, token = arg
+                writer = cv2.VideoWriter(path, self.fourcc, self.fps, frame_size)
+                if writer.isOpened():
+                    self.recordings += 1
+                else:
+                    self.errors += 1
+                    writer = None
+                if preroll is not None:
+                    if writer is not None:
+                        written = 0
+                        for frame in preroll.frames(token, frame_size):
+                            writer.write(frame)
+                            written += 1
+                        with self._cond:
+                            self.frames_written += written
+                    preroll.release(token)
+            elif kind == "stop":
+                return
+
+
+class PreRollBuffer(object):
+    """Ring buffer of the most recent frames of one camera, in fixed memory.
+
+    Frames are stored downscaled by `scale`, or additionally JPEG compressed
+    when `jpeg_quality` is set, in slots of a block allocated once (and again
+    only if the frame size changes). The number of slots covers `seconds` of
+    frames at `fps`, but never more than `max_bytes` of memory.
+
+    The fixed memory covers the slot storage. Raw frames are resized straight
+    into their slot, so steady-state buffering does not allocate. JPEG mode
+    (off by default) allocates one encode output array per frame, which is
+    copied into its slot and freed.
+
+    take() freezes the buffer for a recording writer and returns a token
+    naming the frames that recording gets; push() is a no-op while any taken
+    token is pending. When recordings start faster than the writer opens
+    them, the later tokens hold only the frames pushed since the previous
+    take (none, while frozen), and buffering resumes once the writer
+    releases the newest token.
+
+    Arguments:
+        seconds (float): Footage kept before the trigger
+        fps (float): Rate at which frames are pushed (the recording frame rate)
+        scale (float): Resize factor of the stored frames
+        max_bytes (int): Hard limit on the memory used by the stored frames
+        jpeg_quality (int): When set, frames are stored as JPEG of this quality
+    """
+
+    # Room left for one JPEG frame, as a fraction of the raw downscaled frame
+    JPEG_SLOT_RATIO = 0.25
+
+    def __init__(self, seconds=3.0, fps=20.0, scale=0.5, max_bytes=64 * 1024 * 1024, jpeg_quality=None):
+        self.seconds = seconds
+        self.fps = fps
+        self.scale = scale
+        self.max_bytes = max_bytes
+        self.jpeg_quality = jpeg_quality
+        self.frames_skipped = 0
+        self.capacity = 0
+        self._shape = None
+        self._stored_shape = None
+        self._slots = None
+        self._sizes = None
+        self._scratch = None
+        self._output = None
+        self._next = 0
+        self._count = 0
+        self._taken = False
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self):
+        return self._slots.nbytes if self._slots is not None else 0
+
+    def _allocate(self, shape):
+        h, w = shape[:2]
+        stored_shape = (max(int(h * self.scale), 1), max(int(w * self.scale), 1)) + tuple(shape[2:])
+        raw_bytes = int(np.prod(stored_shape))
+        slot_bytes = max(int(raw_bytes * self.JPEG_SLOT_RATIO), 1) if self.jpeg_quality else raw_bytes
+        self.capacity = max(min(int(round(self.seconds * self.fps)), self.max_bytes // slot_bytes), 0)
+
+        self._shape = shape
+        self._stored_shape = stored_shape
+        self._slots = np.empty((self.capacity, slot_bytes), np.uint8)
+        self._sizes = np.zeros(self.capacity, np.int64)
+        self._scratch = np.empty(stored_shape, np.uint8) if self.jpeg_quality else None
+        self._next = 0
+        self._count = 0
+
+    def push(self, frame):
+        """Stores a frame, overwriting the oldest one when the buffer is full"""
+        if self._taken:
+            return
+        if frame.shape != self._shape:
+            self._allocate(frame.shape)
+        if self.capacity == 0:
+            return
+
+        h, w = self._stored_shape[:2]
+        slot = self._slots[self._next]
+        if self.jpeg_quality:
+            cv2.resize(frame, (w, h), dst=self._scratch, interpolation=cv2.INTER_AREA)
+            ok, encoded = cv2.imencode(".jpg", self._scratch, (cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality))
+            if not ok or encoded.size > slot.size:
+                self.frames_skipped += 1
+                return
+            slot[:encoded.size] = encoded.ravel()
+            self._sizes[self._next] = encoded.size
+        else:
+            image = slot.reshape(self._stored_shape)
+            if (h, w) == frame.shape[:2]:
+                np.copyto(image, frame)
+            else:
+                cv2.resize(frame, (w, h), dst=image, interpolation=cv2.INTER_AREA)
+            self._sizes[self._next] = slot.size
+
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def take(self):
+        """Freezes the buffer for a writer and returns the token of its frames.
+
+        Pushes are ignored until the newest token is released.
+        """
+        with self._lock:
+            self._generation += 1
+            start = (self._next - self._count) % self.capacity if self.capacity else 0
+            token = (self._generation, start, self._count)
+            # Frames handed to this token are not given to a later one
+            self._count = 0
+            self._taken = True
+            return token
+
+    def release(self, token):
+        """Ends the use of a token; buffering resumes when it is the newest one"""
+        with self._lock:
+            if token[0] == self._generation:
+                self._count = 0
+                self._next = 0
+                self._taken = False
+
+    def frames(self, token, frame_size):
+        """Yields the frames of a token, oldest first, resized to frame_size (width, height).
+
+        The yielded array is reused, so each frame must be consumed before the next.
+        """
+        _, start, count = token
+        for i in range(count):
+            index = (start + i) % self.capacity
+            slot = self._slots[index]
+            if self.jpeg_quality:
+                image = cv2.imdecode(slot[:self._sizes[index]], cv2.IMREAD_UNCHANGED)
+            else:
+                image = slot.reshape(self._stored_shape)
+            if image.shape[:2] == (frame_size[1], frame_size[0]):
+                yield image
+                continue
+            if self._output is None or self._output.shape[:2] != (frame_size[1], frame_size[0]):
+                self._output = np.empty((frame_size[1], frame_size[0]) + image.shape[2:], np.uint8)
+            yield cv2.resize(image, tuple(frame_size), dst=self._output, interpolation=cv2.INTER_LINEAR)
@@ -2,16 +2,30 @@ import cv2
 import sys
 import numpy as np
 import datetime
+import math
 import os
+import queue
 import subprocess
 import tkinter as tk
 from tkinter import ttk
 from PIL import Image, ImageTk
-from ultralytics import YOLO
-from gaze_tracking import GazeTracking
+import argparse
+from metrics import Metrics, MetricsServer
+from security_engine import DropOldestQueue, SecurityEngine, parse_source
+
+
+# Time filters of the ARCHIVE tab, in seconds back from now
+ARCHIVE_PERIODS = {
+    "All time": None,
+    "Last 24 hours": 24 * 3600,
+    "Last 7 days": 7 * 24 * 3600,
+    "Last 30 days": 30 * 24 * 3600,
+}
+ARCHIVE_PAGE_SIZE = 50
+
 
 class SecuritySystem:
-    def __init__(self, window, window_title):
+    def __init__(self, window, window_title, sources=(0,), metrics_port=None):
         self.window = window
         self.window.title(window_title)
         self.window.geometry("1200x800")
@@ -30,19 +44,22 @@ class SecuritySystem:
 
         # --- LOGIC INITIALIZATION ---
         print("Initialising AI Core...")
-        self.model = YOLO('yolov8n.pt') 
-        self.fgbg = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=50, detectShadows=False)
-        self.gaze = GazeTracking()
-        
-        self.cap = cv2.VideoCapture(0)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-        
-        self.is_recording = False
-        self.out = None
-        self.no_motion_frames = 0
-        self.recording_cooldown = 30
-        self.latest_frame = None
+        # Metrics are only collected while the endpoint or the overlay needs them
+        self.metrics = Metrics(enabled=metrics_port is not None)
+        self.metrics_server = MetricsServer(self.metrics, port=metrics_port).start() if metrics_port else None
+        self.engine = SecurityEngine(sources, on_event=self.on_engine_event, on_frames=self.on_engine_frames,
+                                     metrics=self.metrics, incident_index="incidents.sqlite")
+        self.cameras = self.engine.cameras
+
+        # The engine's analysis thread feeds composed, display-ready frames to
+        # the Tk render callback through a drop-oldest queue
+        self.display_queue = DropOldestQueue(maxsize=1)
+        self.metrics.register_callback("display_queue_depth", self.display_queue.__len__)
+        self.metrics.register_callback("display_frames_dropped_total", lambda: self.display_queue.dropped,
+                                       kind="counter")
+        self.ui_events = queue.Queue()
+        self.canvas_size = (1, 1)
+        self.overlay_enabled = False
 
         # Variables
         self.use_roi = tk.BooleanVar(value=True)
@@ -50,22 +67,8 @@ class SecuritySystem:
         self.use_low_light = tk.BooleanVar(value=True)
         self.use_distortion_correction = tk.BooleanVar(value=True)
         self.use_auto_roi = tk.BooleanVar(value=False)  # NEW: Auto ROI detection
+        self.show_metrics = tk.BooleanVar(value=False)
         
-        # Auto ROI variables
-        self.roi_coords = None
-        self.roi_learning_frames = 0
-        self.roi_max_learning = 100  # Learn ROI over first 100 frames
-
-        # Camera calibration parameters (simulated for typical webcam)
-        self.camera_matrix = np.array([
-            [1280, 0, 640],      # fx, 0, cx
-            [0, 1280, 360],      # 0, fy, cy  
-            [0, 0, 1]            # 0, 0, 1
-        ], dtype=np.float32)
-        
-        # Distortion coefficients: k1, k2, p1, p2, k3
-        self.distortion_coeffs = np.array([-0.2, 0.1, 0.001, 0.001, -0.05], dtype=np.float32)
-
         # --- UI LAYOUT ---
         self.header = tk.Frame(self.window, bg=self.colors["card"], height=70)
         self.header.pack(fill=tk.X, side=tk.TOP)
@@ -117,6 +120,10 @@ class SecuritySystem:
                        bg=self.colors["card"], fg=self.colors["text"], selectcolor=self.colors["bg"],
                        activebackground=self.colors["card"], font=("Arial", 11), command=self.toggle_auto_roi).pack(anchor="w", pady=(10, 0))
 
+        tk.Checkbutton(self.control_panel, text="Performance Overlay", variable=self.show_metrics, 
+                       bg=self.colors["card"], fg=self.colors["text"], selectcolor=self.colors["bg"],
+                       activebackground=self.colors["card"], font=("Arial", 11), command=self.toggle_metrics).pack(anchor="w", pady=(10, 0))
+
         tk.Label(self.control_panel, text="MOTION SENSITIVITY", bg=self.colors["card"], 
                  fg=self.colors["dim"], font=("Arial", 8, "bold")).pack(anchor="w", pady=(20, 5))
         
@@ -139,10 +146,37 @@ class SecuritySystem:
 
         self.tab_rec = tk.Frame(self.tabs, bg=self.colors["card"])
         self.tabs.add(self.tab_rec, text=" ARCHIVE ")
+
+        # The archive is read one page at a time from the incident index
+        self.archive_page = 0
+        self.archive_rows = []
+        self.archive_period = tk.StringVar(value="All time")
+        self.archive_class = tk.StringVar(value="All classes")
+        filters = tk.Frame(self.tab_rec, bg=self.colors["card"])
+        filters.pack(fill=tk.X, padx=5, pady=(5, 0))
+        self.period_box = ttk.Combobox(filters, textvariable=self.archive_period, values=list(ARCHIVE_PERIODS),
+                                       state="readonly", width=12)
+        self.period_box.pack(side=tk.LEFT)
+        self.class_box = ttk.Combobox(filters, textvariable=self.archive_class, values=["All classes"],
+                                      state="readonly", width=14)
+        self.class_box.pack(side=tk.RIGHT)
+        self.period_box.bind("<<ComboboxSelected>>", lambda _: self.refresh_recordings(page=0))
+        self.class_box.bind("<<ComboboxSelected>>", lambda _: self.refresh_recordings(page=0))
+
         self.rec_list = tk.Listbox(self.tab_rec, bg="#000", fg="white", bd=0, 
                                    selectbackground=self.colors["accent"], font=("Arial", 10))
         self.rec_list.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
+        pager = tk.Frame(self.tab_rec, bg=self.colors["card"])
+        pager.pack(fill=tk.X, padx=5)
+        for text, step, side in (("◀", -1, tk.LEFT), ("▶", 1, tk.RIGHT)):
+            tk.Button(pager, text=text, command=lambda step=step: self.refresh_recordings(page=self.archive_page + step),
+                      bg="#1E293B", fg="#F8FAFC", relief="flat", font=("Arial", 10, "bold"),
+                      activebackground="#334155", activeforeground="#F8FAFC",
+                      borderwidth=0, highlightthickness=0).pack(side=side)
+        self.page_label = tk.Label(pager, text="", bg=self.colors["card"], fg=self.colors["dim"], font=("Arial", 9))
+        self.page_label.pack(side=tk.LEFT, expand=True)
+
         tk.Button(self.tab_rec, text="▶ VIEW FOOTAGE", command=self.play_recording, 
                   bg="#1E293B", fg="#F8FAFC", relief="flat", font=("Arial", 10, "bold"),
                   activebackground="#334155", activeforeground="#F8FAFC", 
@@ -156,228 +190,116 @@ class SecuritySystem:
         self.btn_quit.pack(side=tk.BOTTOM, fill=tk.X)
 
         self.refresh_recordings()
+        self.sync_settings()
+
+        self.engine.start()
         self.update_loop()
 
+    def post_ui(self, callback, *args, **kwargs):
+        """Schedules a widget update on the Tk thread (safe to call from any thread)"""
+        self.ui_events.put((callback, args, kwargs))
+
+    def drain_ui_events(self):
+        while True:
+            try:
+                callback, args, kwargs = self.ui_events.get_nowait()
+            except queue.Empty:
+                return
+            callback(*args, **kwargs)
+
+    def sync_settings(self):
+        """Snapshots the Tk variables so worker threads never touch Tcl objects"""
+        self.engine.settings = {
+            "use_roi": self.use_roi.get(),
+            "use_gaze": self.use_gaze.get(),
+            "use_low_light": self.use_low_light.get(),
+            "use_distortion_correction": self.use_distortion_correction.get(),
+            "use_auto_roi": self.use_auto_roi.get(),
+            "min_area": self.sensitivity.get(),
+        }
+        self.canvas_size = (self.canvas.winfo_width(), self.canvas.winfo_height())
+        self.overlay_enabled = self.show_metrics.get()
+
+    def on_engine_event(self, event):
+        """Engine events arrive on the analysis thread and are replayed on the Tk thread"""
+        self.log_message(event["message"])
+        if event["type"] in ("recording_started", "recording_stopped"):
+            self.update_status()
+        if event["type"] == "recording_saved":
+            self.post_ui(self.refresh_recordings)
+
+    def on_engine_frames(self, frames):
+        with self.metrics.timer("display"):
+            display = self.compose_display()
+        self.display_queue.put(display)
+
     def log_message(self, message):
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        self.post_ui(self._append_log, f"[{timestamp}] {message}\n")
+
+    def _append_log(self, line):
         self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
+        self.log_text.insert(tk.END, line)
         self.log_text.see(tk.END)
         self.log_text.config(state='disabled')
 
-    def start_recording(self, frame, frame_width, frame_height):
-        if not os.path.exists("recordings"):
-            os.makedirs("recordings")
-        filename = f"recordings/incident_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.avi"
-        fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-        self.out = cv2.VideoWriter(filename, fourcc, 20.0, (frame_width, frame_height))
-        self.is_recording = True
-        self.status_indicator.config(text="● RECORDING", fg=self.colors["alert"])
-        self.log_message(f"TRIGGER: Recording started")
-
-    def stop_recording(self):
-        if self.is_recording:
-            self.out.release()
-            self.is_recording = False
-            self.status_indicator.config(text="● SYSTEM ONLINE", fg=self.colors["success"])
-            self.log_message("STATUS: Recording saved")
-            self.refresh_recordings()
-
-    def correct_distortion(self, frame):
-        """Apply camera distortion correction using calibration parameters"""
-        return cv2.undistort(frame, self.camera_matrix, self.distortion_coeffs)
-
-    def enhance_low_light(self, frame):
-        """Apply low light enhancement using histogram equalization"""
-        img_yuv = cv2.cvtColor(frame, cv2.COLOR_BGR2YUV)
-        img_yuv[:,:,0] = cv2.equalizeHist(img_yuv[:,:,0])
-        enhanced_frame = cv2.cvtColor(img_yuv, cv2.COLOR_YUV2BGR)
-        return enhanced_frame
-
-    def detect_auto_roi(self, frame):
-        """Automatically detect ROI based on scene analysis"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Method 1: Edge-based ROI (detect doorways, windows, etc.)
-        edges = cv2.Canny(gray, 50, 150)
-        
-        # Find contours of significant structures
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Filter contours by size and aspect ratio
-        significant_contours = []
-        h, w = frame.shape[:2]
-        min_area = (w * h) * 0.02  # At least 2% of frame
-        
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area > min_area:
-                x, y, cw, ch = cv2.boundingRect(contour)
-                # Check if it's a reasonable shape for a doorway/window
-                aspect_ratio = ch / cw
-                if 0.5 < aspect_ratio < 3.0:  # Not too wide or too tall
-                    significant_contours.append((x, y, x+cw, y+ch))
-        
-        if significant_contours:
-            # Find the most central significant structure
-            center_x, center_y = w//2, h//2
-            closest_dist = float('inf')
-            best_roi = None
-            
-            for x1, y1, x2, y2 in significant_contours:
-                roi_center_x = (x1 + x2) // 2
-                roi_center_y = (y1 + y2) // 2
-                dist = np.sqrt((roi_center_x - center_x)**2 + (roi_center_y - center_y)**2)
-                
-                if dist < closest_dist:
-                    closest_dist = dist
-                    best_roi = (x1, y1, x2, y2)
-            
-            return best_roi
-        
-        # Method 2: Motion-based ROI learning
-        return self.learn_roi_from_motion(frame)
-
-    def learn_roi_from_motion(self, frame):
-        """Learn ROI from accumulated motion patterns"""
-        if self.roi_learning_frames < self.roi_max_learning:
-            # Apply background subtraction
-            mask = self.fgbg.apply(frame)
-            _, mask = cv2.threshold(mask, 254, 255, cv2.THRESH_BINARY)
-            
-            # Find motion areas
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            if contours:
-                # Get bounding box of all motion
-                all_points = np.vstack([contour for contour in contours])
-                x, y, w, h = cv2.boundingRect(all_points)
-                
-                # Expand ROI slightly for better coverage
-                padding = 50
-                h_frame, w_frame = frame.shape[:2]
-                
-                roi_x1 = max(0, x - padding)
-                roi_y1 = max(0, y - padding)
-                roi_x2 = min(w_frame, x + w + padding)
-                roi_y2 = min(h_frame, y + h + padding)
-                
-                if self.roi_coords is None:
-                    self.roi_coords = [roi_x1, roi_y1, roi_x2, roi_y2]
-                else:
-                    # Gradually expand ROI to encompass all detected motion
-                    self.roi_coords[0] = min(self.roi_coords[0], roi_x1)
-                    self.roi_coords[1] = min(self.roi_coords[1], roi_y1)
-                    self.roi_coords[2] = max(self.roi_coords[2], roi_x2)
-                    self.roi_coords[3] = max(self.roi_coords[3], roi_y2)
-            
-            self.roi_learning_frames += 1
-            
-            if self.roi_learning_frames == self.roi_max_learning:
-                self.log_message("AUTO-ROI: Learning complete")
-        
-        return tuple(self.roi_coords) if self.roi_coords else None
+    def update_status(self):
+        if self.engine.is_recording:
+            self.post_ui(self.status_indicator.config, text="● RECORDING", fg=self.colors["alert"])
+        else:
+            self.post_ui(self.status_indicator.config, text="● SYSTEM ONLINE", fg=self.colors["success"])
 
-    def update_loop(self):
-        ret, frame = self.cap.read()
-        if ret:
-            self.latest_frame = frame
-            
-            # Apply distortion correction if enabled
-            if self.use_distortion_correction.get():
-                frame = self.correct_distortion(frame)
-            
-            # Apply low light enhancement if enabled
-            if self.use_low_light.get():
-                frame = self.enhance_low_light(frame)
-            
-            # Initialize auto_roi variable
-            auto_roi = None
-            
-            # CREATE ROI MASK FIRST (before background subtraction)
-            roi_frame = frame.copy()  # Work with a copy for ROI processing
-            yolo_frame = frame.copy()  # Separate frame for YOLO processing
-            
-            if self.use_roi.get():
-                if self.use_auto_roi.get():
-                    # Auto-detect ROI
-                    auto_roi = self.detect_auto_roi(frame)
-                    if auto_roi:
-                        roi_x1, roi_y1, roi_x2, roi_y2 = auto_roi
-                    else:
-                        # Fallback to default ROI
-                        h, w = frame.shape[:2]
-                        roi_x1, roi_y1 = int(w*0.1), int(h*0.3)
-                        roi_x2, roi_y2 = int(w*0.9), int(h*0.9)
-                else:
-                    # Manual ROI (existing behavior)
-                    h, w = frame.shape[:2]
-                    roi_x1, roi_y1 = int(w*0.1), int(h*0.3)
-                    roi_x2, roi_y2 = int(w*0.9), int(h*0.9)
-                
-                # Apply ROI mask to BOTH motion detection AND YOLO frames
-                roi_frame = np.zeros_like(frame)
-                roi_frame[roi_y1:roi_y2, roi_x1:roi_x2] = frame[roi_y1:roi_y2, roi_x1:roi_x2]
-                
-                # Mask YOLO frame as well
-                yolo_frame = np.zeros_like(frame)
-                yolo_frame[roi_y1:roi_y2, roi_x1:roi_x2] = frame[roi_y1:roi_y2, roi_x1:roi_x2]
-            
-            # Apply background subtraction to the ROI-masked frame
-            mask = self.fgbg.apply(roi_frame)
-            _, mask = cv2.threshold(mask, 254, 255, cv2.THRESH_BINARY)
-
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            motion_detected = any(cv2.contourArea(c) > self.sensitivity.get() for c in contours)
-
-            if self.use_gaze.get():
-                self.gaze.refresh(frame)
-            
-            # Run YOLO on the ROI-masked frame (or original if ROI disabled)
-            results = self.model(yolo_frame, verbose=False)
-            annotated_frame = results[0].plot()
-            
-            # Draw Auto ROI if enabled (fixed condition)
-            if self.use_roi.get() and self.use_auto_roi.get() and auto_roi is not None:
-                roi_x1, roi_y1, roi_x2, roi_y2 = auto_roi
-                cv2.rectangle(annotated_frame, (roi_x1, roi_y1), (roi_x2, roi_y2), (255, 165, 0), 2)
-                cv2.putText(annotated_frame, "AUTO-ROI", (roi_x1, roi_y1 - 10), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 165, 0), 2)
-            
-            # Draw manual ROI if enabled and auto ROI is disabled
-            elif self.use_roi.get() and not self.use_auto_roi.get():
-                h, w = annotated_frame.shape[:2]
-                roi_x1, roi_y1 = int(w*0.1), int(h*0.3)
-                roi_x2, roi_y2 = int(w*0.9), int(h*0.9)
-                cv2.rectangle(annotated_frame, (roi_x1, roi_y1), (roi_x2, roi_y2), (0, 255, 255), 2)
-                cv2.putText(annotated_frame, "PERIMETER ZONE", (roi_x1, roi_y1 - 10), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-            
-            if self.use_gaze.get():
-                annotated_frame = self.draw_gaze_overlay(annotated_frame)
-
-            if motion_detected:
-                self.no_motion_frames = 0
-                if not self.is_recording:
-                    h, w, _ = frame.shape
-                    self.start_recording(annotated_frame, w, h)
-            else:
-                self.no_motion_frames += 1
-                if self.is_recording and self.no_motion_frames > self.recording_cooldown:
-                    self.stop_recording()
-
-            if self.is_recording:
-                cv2.circle(annotated_frame, (30, 30), 10, (0, 0, 255), -1)
-                self.out.write(annotated_frame)
-
-            cv_w, cv_h = self.canvas.winfo_width(), self.canvas.winfo_height()
+    def compose_display(self):
+        """Fits the newest annotated frame of each camera into the canvas as an RGB grid"""
+        cv_w, cv_h = self.canvas_size
+        if len(self.cameras) == 1:
+            display = self.cameras[0].annotated_frame
             if cv_w > 1:
-                annotated_frame = cv2.resize(annotated_frame, (cv_w, cv_h))
+                display = cv2.resize(display, (cv_w, cv_h))
+            elif self.overlay_enabled:
+                display = display.copy()
+            if self.overlay_enabled:
+                self.draw_metrics_overlay(display)
+            return cv2.cvtColor(display, cv2.COLOR_BGR2RGB)
+
+        if cv_w <= 1:
+            cv_w, cv_h = 1280, 720
+        cols = math.ceil(math.sqrt(len(self.cameras)))
+        rows = math.ceil(len(self.cameras) / cols)
+        tile_w, tile_h = cv_w // cols, cv_h // rows
+        display = np.zeros((tile_h * rows, tile_w * cols, 3), np.uint8)
+        for i, camera in enumerate(self.cameras):
+            if camera.annotated_frame is None:
+                continue
+            row, col = divmod(i, cols)
+            tile = display[row*tile_h:(row+1)*tile_h, col*tile_w:(col+1)*tile_w]
+            tile[:] = cv2.resize(camera.annotated_frame, (tile_w, tile_h))
+            cv2.putText(tile, camera.name, (10, tile_h - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        if self.overlay_enabled:
+            self.draw_metrics_overlay(display)
+        return cv2.cvtColor(display, cv2.COLOR_BGR2RGB)
+
+    def draw_metrics_overlay(self, frame):
+        """Draws fps and per-stage p50/p99 latency in the top-right corner"""
+        lines = [f"FPS {self.metrics.fps():.1f}"]
+        lines += [f"{stage} {p50:.1f}/{p99:.1f} ms" for stage, (p50, p99) in sorted(self.metrics.summary().items())]
+        x = max(frame.shape[1] - 260, 0)
+        for i, line in enumerate(lines):
+            cv2.putText(frame, line, (x, 20 + i * 16), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 255), 1)
 
-            img = cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGB)
-            img = ImageTk.PhotoImage(Image.fromarray(img))
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=img)
-            self.canvas.image = img
+    def update_loop(self):
+        """Render stage: only applies UI events and shows the newest processed frame"""
+        if not self.engine.running.is_set():
+            return
+        self.sync_settings()
+        self.drain_ui_events()
+
+        frame = self.display_queue.get(timeout=0)
+        if frame is not None:
+            with self.metrics.timer("render"):
+                img = ImageTk.PhotoImage(Image.fromarray(frame))
+                self.canvas.create_image(0, 0, anchor=tk.NW, image=img)
+                self.canvas.image = img
 
         self.window.after(10, self.update_loop)
 
@@ -395,37 +317,68 @@ class SecuritySystem:
 
     def toggle_auto_roi(self):
         if self.use_auto_roi.get():
-            self.roi_coords = None
-            self.roi_learning_frames = 0
+            self.engine.reset_auto_roi()
             self.log_message("AUTO-ROI: Learning mode activated")
         else:
             self.log_message("AUTO-ROI: Manual mode restored")
 
-    def draw_gaze_overlay(self, frame):
-        h, w = frame.shape[:2]
-        l, r = self.gaze.pupil_left_coords(), self.gaze.pupil_right_coords()
-        for p in [l, r]:
-            if p: cv2.circle(frame, p, 5, (0, 255, 0), -1)
-        return frame
+    def toggle_metrics(self):
+        self.metrics.enabled = self.show_metrics.get() or self.metrics_server is not None
+        state = "ENABLED" if self.show_metrics.get() else "DISABLED"
+        self.log_message(f"SYSTEM: Performance overlay {state}")
 
-    def refresh_recordings(self):
+    def refresh_recordings(self, page=None):
+        """Shows one page of recordings from the incident index, newest first"""
         self.rec_list.delete(0, tk.END)
-        if os.path.exists("recordings"):
-            for f in sorted([f for f in os.listdir("recordings") if f.endswith(".avi")], reverse=True):
-                self.rec_list.insert(tk.END, f)
+        index = self.engine.index
+        if index is None:
+            # Without an index, fall back to listing the recordings directory
+            recordings_dir = self.engine.recordings_dir
+            self.archive_rows = []
+            if os.path.exists(recordings_dir):
+                for f in sorted([f for f in os.listdir(recordings_dir) if f.endswith(".avi")], reverse=True):
+                    self.archive_rows.append({"path": os.path.join(recordings_dir, f)})
+                    self.rec_list.insert(tk.END, f)
+            return
+
+        self.class_box.config(values=["All classes"] + index.classes())
+        period = ARCHIVE_PERIODS.get(self.archive_period.get())
+        label = self.archive_class.get()
+        filters = {
+            "start": datetime.datetime.now().timestamp() - period if period else None,
+            "label": None if label == "All classes" else label,
+        }
+        pages = max(math.ceil(index.count(**filters) / ARCHIVE_PAGE_SIZE), 1)
+        self.archive_page = min(max(self.archive_page if page is None else page, 0), pages - 1)
+        self.archive_rows = index.query(limit=ARCHIVE_PAGE_SIZE, offset=self.archive_page * ARCHIVE_PAGE_SIZE,
+                                        **filters)
+        for row in self.archive_rows:
+            started = datetime.datetime.fromtimestamp(row["start_time"]).strftime("%Y-%m-%d %H:%M:%S")
+            duration = f"{row['duration']:.0f}s" if row["duration"] is not None else "..."
+            self.rec_list.insert(tk.END, f"{started}  {row['camera'] or ''}  {duration}  {row['classes']}")
+        self.page_label.config(text=f"page {self.archive_page + 1}/{pages}")
 
     def play_recording(self):
         selection = self.rec_list.curselection()
         if selection:
-            path = os.path.abspath(os.path.join("recordings", self.rec_list.get(selection[0])))
+            path = os.path.abspath(self.archive_rows[selection[0]]["path"])
             subprocess.call(('open', path))
 
     def quit_app(self):
-        self.stop_recording()
-        self.cap.release()
+        self.engine.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
         self.window.destroy()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Smart security camera with eye tracking.")
+    parser.add_argument("sources", nargs="*", default=["0"],
+                        help="camera indexes, video files or stream URLs (default: camera 0)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    args = parser.parse_args()
+
     root = tk.Tk()
-    app = SecuritySystem(root, "SATORU GOJO SIX EYES SYSTEM ")
+    app = SecuritySystem(root, "SATORU GOJO SIX EYES SYSTEM ", [parse_source(s) for s in args.sources],
+                         metrics_port=args.metrics_port)
     root.mainloop()
\ No newline at end of file
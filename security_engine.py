@@ -0,0 +1,836 @@
+"""Frame-processing engine of the security camera, independent of any UI.
+
+`SecurityEngine` owns the capture sources, the shared YOLO model, gaze
+tracking and per-camera motion/recording state. The Tk app in
+security_cam.py is a thin client on top of it; this module can also run
+headless from the command line:
+
+    python security_engine.py 0 recordings/lobby.avi --gaze
+"""
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+from gaze_tracking import CalibrationStore, GazeTracking, SessionRecorder
+from gaze_tracking.pupil_detectors import PUPIL_DETECTORS
+from gaze_tracking.smoothing import SMOOTHERS
+from incident_index import IncidentIndex
+from metrics import Metrics, MetricsServer
+from recording import OVERFLOW_POLICIES, PreRollBuffer, RecordingWriter
+
+
+class DropOldestQueue:
+    """Bounded FIFO between pipeline stages.
+
+    A full queue never blocks the producer: the oldest item is discarded
+    and counted in `dropped`, so a slow consumer only ever sees recent frames.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Returns the oldest item, or None if nothing arrived within `timeout`"""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class Camera:
+    """One capture source with its own capture thread and motion/recording state.
+
+    `source` is anything cv2.VideoCapture accepts: a device index, a video
+    file or a stream URL such as rtsp://host/stream. With `source=None` no
+    device is opened and frames are passed in directly (see process_frame).
+    """
+
+    def __init__(self, source, name, width=1280, height=720):
+        self.source = source
+        self.name = name
+        self.cap = cv2.VideoCapture(source) if source is not None else None
+        if isinstance(source, int):
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+        self.fgbg = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=50, detectShadows=False)
+        self.capture_queue = DropOldestQueue(maxsize=2)
+        self.thread = None
+
+        self.is_recording = False
+        self.writer = None
+        self.preroll = None
+        # What the current recording has seen, for the incident index
+        self.incident = None
+        self.recording_path = None
+        self.no_motion_frames = 0
+        self.latest_frame = None
+        self.annotated_frame = None
+
+        # Detections carried over frames where YOLO is skipped
+        self.last_results = None
+        self.last_inference_time = 0.0
+
+        # Auto ROI variables
+        self.roi_coords = None
+        self.roi_learning_frames = 0
+
+        # Undistortion remap tables, rebuilt only when frame size or calibration changes
+        self.undistort_key = None
+        self.undistort_maps = None
+        self.undistort_buffer = None
+
+    def capture_loop(self, running):
+        """Capture stage: grabs frames as fast as the source delivers them"""
+        while running.is_set():
+            ret, frame = self.cap.read()
+            if ret:
+                self.capture_queue.put(frame)
+            else:
+                time.sleep(0.01)
+
+    def start(self, running):
+        self.thread = threading.Thread(target=self.capture_loop, args=(running,),
+                                       name=f"capture-{self.name}", daemon=True)
+        self.thread.start()
+
+    def release(self):
+        """Stops capture and recording; returns False if the recording writer did not finish"""
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+        if self.cap is not None:
+            self.cap.release()
+        if self.writer is not None:
+            return self.writer.shutdown()
+        return True
+
+
+# Pipeline switches; the Tk app overwrites these from its checkboxes and slider
+DEFAULT_SETTINGS = {
+    "use_roi": True,
+    "use_gaze": False,
+    "use_low_light": True,
+    "use_distortion_correction": True,
+    "use_auto_roi": False,
+    "min_area": 1000,
+}
+
+
+class SecurityEngine:
+    """Runs the detection pipeline over one or more capture sources.
+
+    Arguments:
+        sources (list): Camera indexes, video files or stream URLs
+        model_path (str): YOLO weights shared by all cameras
+        recordings_dir (str): Directory where incident recordings are written
+        on_event (callable): Called with an event dict for log lines and
+            recording start/stop (from the analysis thread in live mode);
+            "recording_saved" comes from the camera's writer thread once the
+            file is complete
+        on_frames (callable): Called with (Camera, annotated frame) pairs
+            after every analysis step
+        metrics (metrics.Metrics): Receives stage latencies, frame and queue
+            counters; a disabled registry is used when omitted
+        gaze_detect_interval (int): Frames between full face detections in
+            gaze tracking; the face is tracked in between
+        gaze_detect_scale (float): Downscale factor of the frame used for face
+            detection (landmarks stay at full resolution)
+        calibration_profiles (str): JSON file where gaze calibrations are
+            saved and reloaded across sessions (None to always calibrate anew)
+        pupil_detector (str): Pupil localization engine, "contour" or "centroid"
+        gaze_smoothing (str): Pupil coordinate filter, see gaze_tracking.smoothing
+        gaze_session (str): When set, gaze samples are recorded to this session
+            file (see gaze_tracking.session)
+        recording_queue (int): Frames each camera's recording writer may hold
+            while the disk catches up
+        recording_overflow (str): What a full recording queue does, see
+            recording.OVERFLOW_POLICIES
+        pre_roll (float): Seconds of footage before the trigger that open each
+            recording (0 to disable)
+        post_roll (float): Seconds without motion before a recording stops
+        pre_roll_scale (float): Resize factor of the frames kept for the pre-roll
+        pre_roll_memory (int): Memory limit (bytes) of the pre-roll of all
+            cameras together
+        pre_roll_jpeg (int): When set, pre-roll frames are kept as JPEG of this
+            quality, which fits more seconds in the same memory (at the cost
+            of one encode buffer allocated per frame)
+        incident_index (str): SQLite file in recordings_dir indexing every
+            recording with its metadata; None (the default) keeps no index.
+            When set, recordings_dir is created at startup
+    """
+
+    def __init__(self, sources=(0,), model_path='yolov8n.pt', recordings_dir="recordings",
+                 on_event=None, on_frames=None, metrics=None, gaze_detect_interval=5,
+                 gaze_detect_scale=0.5, calibration_profiles="calibration_profiles.json",
+                 pupil_detector="contour", gaze_smoothing="boxcar", gaze_session=None,
+                 recording_queue=64, recording_overflow="drop_oldest", pre_roll=3.0, post_roll=1.5,
+                 pre_roll_scale=0.5, pre_roll_memory=128 * 1024 * 1024, pre_roll_jpeg=None,
+                 incident_index=None):
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.model = YOLO(model_path)
+        # Gaze runs on the first source; its calibration is kept per camera
+        profile_store = CalibrationStore(calibration_profiles) if calibration_profiles else None
+        self.gaze = GazeTracking(metrics=self.metrics, detect_interval=gaze_detect_interval,
+                                 detect_scale=gaze_detect_scale, search_margin=0.5,
+                                 profile_store=profile_store, camera_id=str(sources[0]) if sources else "default",
+                                 pupil_detector=pupil_detector, smoothing=gaze_smoothing,
+                                 recorder=SessionRecorder(gaze_session) if gaze_session else None)
+
+        # One Camera per source; all of them share the YOLO model above and are
+        # batched into a single inference call per analysis step
+        self.cameras = [Camera(source, f"CAM{i}") for i, source in enumerate(sources)]
+        for camera in self.cameras:
+            capture_queue = camera.capture_queue
+            self.metrics.register_callback("capture_queue_depth", capture_queue.__len__, camera=camera.name)
+            self.metrics.register_callback("frames_dropped_total", lambda q=capture_queue: q.dropped,
+                                           kind="counter", camera=camera.name)
+
+            # Encoding and disk writes run on a writer thread per camera
+            writer = camera.writer = RecordingWriter(
+                camera.name, max_queue=recording_queue, overflow=recording_overflow, metrics=self.metrics,
+                on_closed=lambda path, c=camera: self.emit("recording_saved", f"STATUS: Recording saved ({c.name})",
+                                                           c, path=path))
+            self.metrics.register_callback("recording_queue_depth", writer.__len__, camera=camera.name)
+            self.metrics.register_callback("recording_frames_written_total", lambda w=writer: w.frames_written,
+                                           kind="counter", camera=camera.name)
+            self.metrics.register_callback("recording_frames_dropped_total", lambda w=writer: w.frames_dropped,
+                                           kind="counter", camera=camera.name)
+
+            # Frames before the trigger, in a fixed share of the pre-roll memory
+            if pre_roll > 0:
+                camera.preroll = PreRollBuffer(seconds=pre_roll, fps=writer.fps, scale=pre_roll_scale,
+                                               max_bytes=pre_roll_memory // len(self.cameras),
+                                               jpeg_quality=pre_roll_jpeg)
+                self.metrics.register_callback("preroll_frames", camera.preroll.__len__, camera=camera.name)
+
+        self.recordings_dir = recordings_dir
+        self.index = None
+        if incident_index:
+            os.makedirs(recordings_dir, exist_ok=True)
+            self.index = IncidentIndex(os.path.join(recordings_dir, incident_index))
+            if self.index.created:
+                # Footage recorded before the index existed is scanned once
+                self.index.import_directory(recordings_dir)
+
+        # Post-roll, counted in frames at the recording frame rate
+        self.recording_cooldown = int(round(post_roll * RecordingWriter.DEFAULT_FPS))
+
+        # YOLO scheduling: inference runs on motion, otherwise once per keep-alive
+        # interval; detections from the last run are carried over skipped frames
+        self.yolo_keepalive_interval = 2.0  # seconds
+
+        # Run MOG2 and YOLO on a cropped view of the perimeter zone instead of a
+        # zero-padded full frame; results are mapped back to frame coordinates
+        self.crop_to_roi = True
+
+        # Auto ROI learning length (per camera)
+        self.roi_max_learning = 100  # Learn ROI over first 100 frames
+
+        # Camera calibration parameters (simulated for typical webcam)
+        self.camera_matrix = np.array([
+            [1280, 0, 640],      # fx, 0, cx
+            [0, 1280, 360],      # 0, fy, cy
+            [0, 0, 1]            # 0, 0, 1
+        ], dtype=np.float32)
+
+        # Distortion coefficients: k1, k2, p1, p2, k3
+        self.distortion_coeffs = np.array([-0.2, 0.1, 0.001, 0.001, -0.05], dtype=np.float32)
+
+        # Replaced as a whole (never mutated) so the analysis thread always
+        # sees a consistent snapshot
+        self.settings = dict(DEFAULT_SETTINGS)
+
+        self.on_event = on_event
+        self.on_frames = on_frames
+        self.running = threading.Event()
+        self.analysis_thread = None
+
+    def emit(self, kind, message, camera=None, **data):
+        event = {
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "type": kind,
+            "message": message,
+        }
+        if camera is not None:
+            event["camera"] = camera.name
+        event.update(data)
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def log_message(self, message):
+        self.emit("log", message)
+
+    @property
+    def is_recording(self):
+        return any(camera.is_recording for camera in self.cameras)
+
+    def start_recording(self, camera, frame_width, frame_height):
+        if not os.path.exists(self.recordings_dir):
+            os.makedirs(self.recordings_dir)
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        suffix = f"_{camera.name}" if len(self.cameras) > 1 else ""
+        filename = os.path.join(self.recordings_dir, f"incident_{timestamp}{suffix}.avi")
+        # The writer thread creates the file; only the request is queued here
+        camera.writer.open(filename, (frame_width, frame_height), preroll=camera.preroll)
+        camera.recording_path = filename
+        camera.is_recording = True
+        if self.index is not None:
+            start_time = time.time()
+            camera.incident = {
+                "id": self.index.start(filename, camera.name, start_time),
+                "frames": 0,
+                "peak_motion_area": 0.0,
+                "classes": set(),
+                "gaze_flags": set(),
+            }
+        self.emit("recording_started", f"TRIGGER: Recording started ({camera.name})", camera, path=filename)
+
+    def stop_recording(self, camera):
+        if camera.is_recording:
+            camera.writer.close()
+            camera.is_recording = False
+            incident, camera.incident = camera.incident, None
+            if incident is not None:
+                self.index.finish(incident.pop("id"), time.time(), **incident)
+            self.emit("recording_stopped", f"STATUS: Recording stopped ({camera.name})", camera,
+                      path=camera.recording_path)
+
+    def correct_distortion(self, camera, frame):
+        """Apply camera distortion correction using calibration parameters.
+
+        cv2.undistort recomputes the per-pixel mapping on every call, so the
+        mapping is built once with initUndistortRectifyMap (fixed-point maps)
+        and applied with remap. The result is written into a buffer owned by
+        the camera, which is overwritten by that camera's next frame.
+        """
+        h, w = frame.shape[:2]
+        key = (w, h, self.camera_matrix.tobytes(), self.distortion_coeffs.tobytes())
+        if key != camera.undistort_key:
+            camera.undistort_maps = cv2.initUndistortRectifyMap(
+                self.camera_matrix, self.distortion_coeffs, None, self.camera_matrix, (w, h), cv2.CV_16SC2)
+            camera.undistort_key = key
+
+        if camera.undistort_buffer is None or camera.undistort_buffer.shape != frame.shape:
+            camera.undistort_buffer = np.empty_like(frame)
+
+        map1, map2 = camera.undistort_maps
+        return cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=camera.undistort_buffer)
+
+    def enhance_low_light(self, frame):
+        """Apply low light enhancement using histogram equalization"""
+        img_yuv = cv2.cvtColor(frame, cv2.COLOR_BGR2YUV)
+        img_yuv[:,:,0] = cv2.equalizeHist(img_yuv[:,:,0])
+        enhanced_frame = cv2.cvtColor(img_yuv, cv2.COLOR_YUV2BGR)
+        return enhanced_frame
+
+    def detect_auto_roi(self, camera, frame):
+        """Automatically detect ROI based on scene analysis"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        
+        # Method 1: Edge-based ROI (detect doorways, windows, etc.)
+        edges = cv2.Canny(gray, 50, 150)
+        
+        # Find contours of significant structures
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        
+        # Filter contours by size and aspect ratio
+        significant_contours = []
+        h, w = frame.shape[:2]
+        min_area = (w * h) * 0.02  # At least 2% of frame
+        
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area > min_area:
+                x, y, cw, ch = cv2.boundingRect(contour)
+                # Check if it's a reasonable shape for a doorway/window
+                aspect_ratio = ch / cw
+                if 0.5 < aspect_ratio < 3.0:  # Not too wide or too tall
+                    significant_contours.append((x, y, x+cw, y+ch))
+        
+        if significant_contours:
+            # Find the most central significant structure
+            center_x, center_y = w//2, h//2
+            closest_dist = float('inf')
+            best_roi = None
+            
+            for x1, y1, x2, y2 in significant_contours:
+                roi_center_x = (x1 + x2) // 2
+                roi_center_y = (y1 + y2) // 2
+                dist = np.sqrt((roi_center_x - center_x)**2 + (roi_center_y - center_y)**2)
+                
+                if dist < closest_dist:
+                    closest_dist = dist
+                    best_roi = (x1, y1, x2, y2)
+            
+            return best_roi
+        
+        # Method 2: Motion-based ROI learning
+        return self.learn_roi_from_motion(camera, frame)
+
+    def learn_roi_from_motion(self, camera, frame):
+        """Learn ROI from accumulated motion patterns"""
+        if camera.roi_learning_frames < self.roi_max_learning:
+            # Apply background subtraction
+            mask = camera.fgbg.apply(frame)
+            _, mask = cv2.threshold(mask, 254, 255, cv2.THRESH_BINARY)
+            
+            # Find motion areas
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            
+            if contours:
+                # Get bounding box of all motion
+                all_points = np.vstack([contour for contour in contours])
+                x, y, w, h = cv2.boundingRect(all_points)
+                
+                # Expand ROI slightly for better coverage
+                padding = 50
+                h_frame, w_frame = frame.shape[:2]
+                
+                roi_x1 = max(0, x - padding)
+                roi_y1 = max(0, y - padding)
+                roi_x2 = min(w_frame, x + w + padding)
+                roi_y2 = min(h_frame, y + h + padding)
+                
+                if camera.roi_coords is None:
+                    camera.roi_coords = [roi_x1, roi_y1, roi_x2, roi_y2]
+                else:
+                    # Gradually expand ROI to encompass all detected motion
+                    camera.roi_coords[0] = min(camera.roi_coords[0], roi_x1)
+                    camera.roi_coords[1] = min(camera.roi_coords[1], roi_y1)
+                    camera.roi_coords[2] = max(camera.roi_coords[2], roi_x2)
+                    camera.roi_coords[3] = max(camera.roi_coords[3], roi_y2)
+            
+            camera.roi_learning_frames += 1
+            
+            if camera.roi_learning_frames == self.roi_max_learning:
+                self.log_message(f"AUTO-ROI: Learning complete ({camera.name})")
+        
+        return tuple(camera.roi_coords) if camera.roi_coords else None
+
+    def reset_auto_roi(self):
+        for camera in self.cameras:
+            camera.roi_coords = None
+            camera.roi_learning_frames = 0
+
+    def start(self):
+        """Live mode: capture threads feed a background analysis thread.
+
+        Frames that arrive while analysis is busy are dropped, so results
+        always reflect the newest frame of each camera.
+        """
+        self.running.set()
+        for camera in self.cameras:
+            camera.start(self.running)
+        self.analysis_thread = threading.Thread(target=self.analysis_loop, name="analysis", daemon=True)
+        self.analysis_thread.start()
+
+    def stop(self):
+        self.running.clear()
+        if self.analysis_thread is not None:
+            self.analysis_thread.join(timeout=5.0)
+        for camera in self.cameras:
+            self.stop_recording(camera)
+            if not camera.release():
+                self.log_message(f"WARNING: Recording writer of {camera.name} did not finish in time")
+        if self.gaze.recorder is not None:
+            self.gaze.recorder.close()
+        if self.index is not None:
+            self.index.close()
+
+    def run(self, max_frames=None):
+        """Batch mode: processes every frame of every source as fast as possible.
+
+        Unlike live mode no frame is dropped. Stops when all sources are
+        exhausted or after `max_frames` frames, and returns the number of
+        frames processed.
+        """
+        processed = 0
+        active = list(self.cameras)
+        while active and (max_frames is None or processed < max_frames):
+            batch = []
+            for camera in list(active):
+                ret, frame = camera.cap.read()
+                if ret:
+                    batch.append((camera, frame))
+                else:
+                    active.remove(camera)
+            if not batch:
+                break
+
+            annotated_frames = self.process_batch(batch)
+            processed += len(batch)
+            if self.on_frames is not None:
+                self.on_frames([(camera, annotated) for (camera, _), annotated in zip(batch, annotated_frames)])
+
+        for camera in self.cameras:
+            self.stop_recording(camera)
+        return processed
+
+    def analysis_loop(self):
+        """Analysis stage: runs the detection pipeline on the newest frame of every camera"""
+        while self.running.is_set():
+            batch = []
+            for camera in self.cameras:
+                frame = camera.capture_queue.get(timeout=0)
+                if frame is not None:
+                    batch.append((camera, frame))
+            if not batch:
+                time.sleep(0.005)
+                continue
+
+            annotated_frames = self.process_batch(batch)
+            if self.on_frames is not None:
+                self.on_frames([(camera, annotated) for (camera, _), annotated in zip(batch, annotated_frames)])
+
+    def process_frame(self, camera, frame):
+        """Runs the full pipeline on a single frame from `camera`"""
+        return self.process_batch([(camera, frame)])[0]
+
+    def process_batch(self, batch):
+        """Runs the pipeline on one frame per camera with a single YOLO call.
+
+        Arguments:
+            batch (list): (Camera, numpy.ndarray) pairs
+
+        Returns:
+            The annotated frames, in the order of `batch`
+        """
+        steps = [self.prepare_frame(camera, frame) for camera, frame in batch]
+
+        # Only cameras that need fresh detections go into the shared batch
+        pending = [step for step in steps if self.should_run_inference(step["camera"], step["motion_detected"])]
+        self.metrics.inc("inference_skipped_total", len(steps) - len(pending))
+        if pending:
+            with self.metrics.timer("yolo"):
+                results = self.model([step["yolo_frame"] for step in pending], verbose=False)
+            self.metrics.inc("inference_frames_total", len(pending))
+            now = time.monotonic()
+            for step, result in zip(pending, results):
+                camera = step["camera"]
+                camera.last_results = [result]
+                camera.last_inference_time = now
+                if step["offset"] != (0, 0):
+                    self.offset_detections(camera.last_results, *step["offset"])
+
+        annotated_frames = [self.finish_frame(step) for step in steps]
+        for _ in steps:
+            self.metrics.mark_frame()
+        return annotated_frames
+
+    def prepare_frame(self, camera, frame):
+        """Pre-inference stages: distortion, low light, ROI, motion and gaze"""
+        settings = self.settings
+        timer = self.metrics.timer
+        camera.latest_frame = frame
+
+        # Apply distortion correction if enabled
+        if settings["use_distortion_correction"]:
+            with timer("distortion"):
+                frame = self.correct_distortion(camera, frame)
+
+        # Apply low light enhancement if enabled
+        if settings["use_low_light"]:
+            with timer("low_light"):
+                frame = self.enhance_low_light(frame)
+
+        # Initialize auto_roi variable
+        auto_roi = None
+
+        # Neither stage writes to its input, so without an ROI both share the frame
+        roi_frame = frame
+        yolo_frame = frame
+        display_frame = frame
+        offset = (0, 0)
+
+        with timer("roi"):
+            if settings["use_roi"]:
+                if settings["use_auto_roi"]:
+                    # Auto-detect ROI
+                    auto_roi = self.detect_auto_roi(camera, frame)
+                    if auto_roi:
+                        roi_x1, roi_y1, roi_x2, roi_y2 = auto_roi
+                    else:
+                        # Fallback to default ROI
+                        h, w = frame.shape[:2]
+                        roi_x1, roi_y1 = int(w*0.1), int(h*0.3)
+                        roi_x2, roi_y2 = int(w*0.9), int(h*0.9)
+                else:
+                    # Manual ROI (existing behavior)
+                    h, w = frame.shape[:2]
+                    roi_x1, roi_y1 = int(w*0.1), int(h*0.3)
+                    roi_x2, roi_y2 = int(w*0.9), int(h*0.9)
+
+                # The auto ROI moves between frames, which would keep resetting a
+                # crop-sized MOG2 model, so only the fixed perimeter zone is cropped
+                if self.crop_to_roi and not settings["use_auto_roi"]:
+                    # Zero-copy view: MOG2 and YOLO only touch the zone's pixels
+                    roi_frame = frame[roi_y1:roi_y2, roi_x1:roi_x2]
+                    yolo_frame = roi_frame
+                    offset = (roi_x1, roi_y1)
+                else:
+                    # Apply ROI mask to BOTH motion detection AND YOLO frames
+                    roi_frame = np.zeros_like(frame)
+                    roi_frame[roi_y1:roi_y2, roi_x1:roi_x2] = frame[roi_y1:roi_y2, roi_x1:roi_x2]
+
+                    # Mask YOLO frame as well
+                    yolo_frame = roi_frame
+                    display_frame = roi_frame
+
+        with timer("motion"):
+            # Apply background subtraction to the ROI-masked frame
+            mask = camera.fgbg.apply(roi_frame)
+            _, mask = cv2.threshold(mask, 254, 255, cv2.THRESH_BINARY)
+
+            # Contours come back in full-frame coordinates even when working on a crop
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
+            motion_area = max((cv2.contourArea(c) for c in contours), default=0.0)
+            motion_detected = motion_area > settings["min_area"]
+
+        # Gaze tracking follows the primary camera only
+        if settings["use_gaze"] and camera is self.cameras[0]:
+            with timer("gaze"):
+                self.gaze.refresh(frame)
+
+        return {
+            "camera": camera,
+            "frame": frame,
+            "yolo_frame": yolo_frame,
+            "display_frame": display_frame,
+            "offset": offset,
+            "auto_roi": auto_roi,
+            "motion_detected": motion_detected,
+            "motion_area": motion_area,
+        }
+
+    def finish_frame(self, step):
+        """Post-inference stages: annotation and per-camera recording"""
+        settings = self.settings
+        timer = self.metrics.timer
+        camera = step["camera"]
+        auto_roi = step["auto_roi"]
+
+        # Draw the (possibly carried-over) detections on the current frame
+        with timer("plot"):
+            annotated_frame = camera.last_results[0].plot(img=step["display_frame"])
+
+        # Draw Auto ROI if enabled (fixed condition)
+        if settings["use_roi"] and settings["use_auto_roi"] and auto_roi is not None:
+            roi_x1, roi_y1, roi_x2, roi_y2 = auto_roi
+            cv2.rectangle(annotated_frame, (roi_x1, roi_y1), (roi_x2, roi_y2), (255, 165, 0), 2)
+            cv2.putText(annotated_frame, "AUTO-ROI", (roi_x1, roi_y1 - 10),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 165, 0), 2)
+
+        # Draw manual ROI if enabled and auto ROI is disabled
+        elif settings["use_roi"] and not settings["use_auto_roi"]:
+            h, w = annotated_frame.shape[:2]
+            roi_x1, roi_y1 = int(w*0.1), int(h*0.3)
+            roi_x2, roi_y2 = int(w*0.9), int(h*0.9)
+            cv2.rectangle(annotated_frame, (roi_x1, roi_y1), (roi_x2, roi_y2), (0, 255, 255), 2)
+            cv2.putText(annotated_frame, "PERIMETER ZONE", (roi_x1, roi_y1 - 10),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+
+        if settings["use_gaze"] and camera is self.cameras[0]:
+            annotated_frame = self.draw_gaze_overlay(annotated_frame)
+
+        if step["motion_detected"]:
+            camera.no_motion_frames = 0
+            if not camera.is_recording:
+                h, w, _ = step["frame"].shape
+                self.start_recording(camera, w, h)
+        else:
+            camera.no_motion_frames += 1
+            if camera.is_recording and camera.no_motion_frames > self.recording_cooldown:
+                self.stop_recording(camera)
+
+        if camera.is_recording:
+            cv2.circle(annotated_frame, (30, 30), 10, (0, 0, 255), -1)
+            with timer("record"):
+                camera.writer.write(annotated_frame)
+            if camera.incident is not None:
+                self.update_incident(camera, step)
+        elif camera.preroll is not None:
+            with timer("preroll"):
+                camera.preroll.push(annotated_frame)
+
+        camera.annotated_frame = annotated_frame
+        return annotated_frame
+
+    def update_incident(self, camera, step):
+        """Accumulates what the running recording of `camera` has seen"""
+        incident = camera.incident
+        incident["frames"] += 1
+        incident["peak_motion_area"] = max(incident["peak_motion_area"], step["motion_area"])
+
+        result = camera.last_results[0]
+        if result.boxes is not None and len(result.boxes):
+            incident["classes"].update(result.names[int(c)] for c in result.boxes.cls.tolist())
+
+        if self.settings["use_gaze"] and camera is self.cameras[0] and self.gaze.pupils_located:
+            flags = incident["gaze_flags"]
+            flags.add("face")
+            if len(self.gaze.faces) > 1:
+                flags.add("multiple_faces")
+            if self.gaze.is_blinking():
+                flags.add("blinking")
+            elif self.gaze.is_left():
+                flags.add("looking_left")
+            elif self.gaze.is_right():
+                flags.add("looking_right")
+
+    @staticmethod
+    def offset_detections(results, dx, dy):
+        """Shifts YOLO boxes from ROI-crop coordinates into full-frame coordinates"""
+        result = results[0]
+        if result.boxes is not None and len(result.boxes):
+            # Prediction tensors are created in inference mode and cannot be
+            # updated in place, so the shifted boxes are built from a clone
+            data = result.boxes.data.clone()
+            data[:, [0, 2]] += dx
+            data[:, [1, 3]] += dy
+            result.boxes = type(result.boxes)(data, result.boxes.orig_shape)
+
+    def should_run_inference(self, camera, motion_detected):
+        """Decides whether YOLO runs on this frame or reuses the last detections"""
+        if motion_detected or camera.last_results is None:
+            return True
+        return time.monotonic() - camera.last_inference_time >= self.yolo_keepalive_interval
+
+    def draw_gaze_overlay(self, frame):
+        for face in self.gaze.faces:
+            for p in [face.pupil_left_coords(), face.pupil_right_coords()]:
+                if p: cv2.circle(frame, p, 5, (0, 255, 0), -1)
+            cv2.putText(frame, f"ID {face.id}", (face.rect.left(), max(face.rect.top() - 8, 12)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        return frame
+
+
+def parse_source(arg):
+    """Camera indexes are given as plain integers, anything else is a file or URL"""
+    return int(arg) if arg.isdigit() else arg
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the security camera pipeline without a UI.")
+    parser.add_argument("sources", nargs="*", default=["0"],
+                        help="camera indexes, video files or stream URLs (default: camera 0)")
+    parser.add_argument("--live", action="store_true",
+                        help="drop frames to keep up with real time instead of processing every frame")
+    parser.add_argument("--max-frames", type=int, default=None, help="stop after this many frames")
+    parser.add_argument("--model", default="yolov8n.pt", help="YOLO weights")
+    parser.add_argument("--recordings-dir", default="recordings")
+    parser.add_argument("--recording-queue", type=int, default=64,
+                        help="frames buffered per camera while recordings are written to disk")
+    parser.add_argument("--recording-overflow", default="drop_oldest", choices=OVERFLOW_POLICIES,
+                        help="what a full recording queue does with new frames")
+    parser.add_argument("--incident-index", default="incidents.sqlite",
+                        help="SQLite index of the recordings, in the recordings directory (empty string to disable)")
+    parser.add_argument("--pre-roll", type=float, default=3.0,
+                        help="seconds of footage before the trigger included in each recording (0 to disable)")
+    parser.add_argument("--post-roll", type=float, default=1.5,
+                        help="seconds without motion before a recording stops")
+    parser.add_argument("--pre-roll-scale", type=float, default=0.5,
+                        help="resize factor of the frames kept for the pre-roll")
+    parser.add_argument("--pre-roll-memory", type=int, default=128,
+                        help="memory limit of the pre-roll of all cameras, in MB")
+    parser.add_argument("--pre-roll-jpeg", type=int, default=None, metavar="QUALITY",
+                        help="keep pre-roll frames as JPEG of this quality instead of raw")
+    parser.add_argument("--min-area", type=float, default=DEFAULT_SETTINGS["min_area"],
+                        help="minimum motion contour area")
+    parser.add_argument("--no-roi", action="store_true", help="disable the perimeter zone")
+    parser.add_argument("--auto-roi", action="store_true", help="detect the ROI automatically")
+    parser.add_argument("--gaze", action="store_true", help="enable gaze tracking on the first source")
+    parser.add_argument("--gaze-detect-interval", type=int, default=5,
+                        help="run the full face detector every N frames and track the face in between")
+    parser.add_argument("--gaze-detect-scale", type=float, default=0.5,
+                        help="downscale factor of the frame used for face detection (1 for full resolution)")
+    parser.add_argument("--calibration-profiles", default="calibration_profiles.json",
+                        help="file storing gaze calibrations between runs (empty string to disable)")
+    parser.add_argument("--pupil-detector", default="contour", choices=sorted(PUPIL_DETECTORS),
+                        help="pupil localization engine used by gaze tracking")
+    parser.add_argument("--gaze-smoothing", default="boxcar", choices=sorted(SMOOTHERS),
+                        help="filter applied to the pupil coordinates")
+    parser.add_argument("--gaze-session", default=None,
+                        help="record gaze samples to this binary session file")
+    parser.add_argument("--no-low-light", action="store_true", help="disable low light enhancement")
+    parser.add_argument("--no-distortion", action="store_true", help="disable lens distortion correction")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    args = parser.parse_args(argv)
+
+    def print_event(event):
+        print(json.dumps(event), flush=True)
+
+    processed = [0]
+
+    def count_frames(frames):
+        processed[0] += len(frames)
+
+    metrics = Metrics(enabled=args.metrics_port is not None)
+    if args.metrics_port is not None:
+        MetricsServer(metrics, port=args.metrics_port).start()
+
+    engine = SecurityEngine([parse_source(s) for s in args.sources], model_path=args.model,
+                            recordings_dir=args.recordings_dir, on_event=print_event, on_frames=count_frames,
+                            metrics=metrics, gaze_detect_interval=args.gaze_detect_interval,
+                            gaze_detect_scale=args.gaze_detect_scale,
+                            calibration_profiles=args.calibration_profiles or None,
+                            pupil_detector=args.pupil_detector, gaze_smoothing=args.gaze_smoothing,
+                            gaze_session=args.gaze_session, recording_queue=args.recording_queue,
+                            recording_overflow=args.recording_overflow, pre_roll=args.pre_roll,
+                            post_roll=args.post_roll, pre_roll_scale=args.pre_roll_scale,
+                            pre_roll_memory=args.pre_roll_memory * 1024 * 1024, pre_roll_jpeg=args.pre_roll_jpeg,
+                            incident_index=args.incident_index or None)
+    engine.settings = {
+        "use_roi": not args.no_roi,
+        "use_gaze": args.gaze,
+        "use_low_light": not args.no_low_light,
+        "use_distortion_correction": not args.no_distortion,
+        "use_auto_roi": args.auto_roi,
+        "min_area": args.min_area,
+    }
+
+    start = time.perf_counter()
+    try:
+        if args.live:
+            engine.start()
+            while args.max_frames is None or processed[0] < args.max_frames:
+                time.sleep(0.1)
+        else:
+            engine.run(max_frames=args.max_frames)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+
+    elapsed = time.perf_counter() - start
+    fps = processed[0] / elapsed if elapsed > 0 else 0.0
+    print(json.dumps({"type": "summary", "frames": processed[0], "seconds": round(elapsed, 3),
+                      "fps": round(fps, 2)}), flush=True)
+
+
+if __name__ == "__main__":
+    main()